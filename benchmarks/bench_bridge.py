@@ -0,0 +1,194 @@
+#!/usr/bin/python3
+"""
+End-to-end throughput and latency benchmark of NooLiteMQTT.
+
+The bridge talks to the MTRF64 emulator (running in a child process on a pty)
+and to an in-process MQTT client stand-in. Scenarios:
+
+  sensor_flood      PT111 frames on all channels, RX frames/s vs published messages/s
+  command_burst     bursts of tx-f commands, command topic to serial write latency
+  postponed_timers  PM112 motion frames on all channels, many pending OFF timers
+
+Results are printed (or written with --output) as JSON.
+
+Usage: python benchmarks/bench_bridge.py [--engine select] [--duration 5] [--output result.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import threading
+from contextlib import redirect_stdout
+from datetime import datetime
+from time import monotonic as time, process_time, sleep
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import noolite_mqtt  # noqa: E402
+from noolite_mqtt.aio import AsyncNooLiteMQTT  # noqa: E402
+from noolite_mqtt.emulator import MTRF64Emulator  # noqa: E402
+from standin import StandInClient  # noqa: E402
+
+SCENARIOS = {
+    'sensor_flood': {
+        'emulator': {'temp_hum_rate': 200.0, 'temp_hum_channels': list(range(64))},
+    },
+    'command_burst': {
+        'emulator': {'ack_delay': 0.02},
+        'bursts': 4,
+        'burst_size': 16,
+    },
+    'postponed_timers': {
+        'emulator': {'motion_rate': 200.0, 'motion_channels': list(range(64))},
+    },
+}
+
+
+def emulator_process(conn, options, stop):
+    emulator = MTRF64Emulator(record=True, seed=1, **options)
+    conn.send(emulator.device)
+    emulator.start()
+    stop.wait()
+    emulator.stop()
+    conn.send({
+        'sent': emulator.sent,
+        'commands': [(t, frame[4], frame[5]) for t, frame in emulator.commands],
+    })
+    emulator.close()
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]  # noqa: E731
+    return {
+        'count': len(values),
+        'p50': pick(0.5),
+        'p90': pick(0.9),
+        'p99': pick(0.99),
+        'max': values[-1],
+        'avg': sum(values) / len(values),
+    }
+
+
+def run_scenario(name: str, engine: str, duration: float, bridge_options: dict):
+    scenario = SCENARIOS[name]
+    conn, child_conn = multiprocessing.Pipe()
+    stop = multiprocessing.Event()
+    process = multiprocessing.Process(target=emulator_process, args=(child_conn, scenario['emulator'], stop))
+    process.start()
+    device = conn.recv()
+
+    noolite_mqtt.mqtt.Client = StandInClient
+    bridge_class = AsyncNooLiteMQTT if engine == 'asyncio' else noolite_mqtt.NooLiteMQTT
+    with redirect_stdout(sys.stderr):
+        bridge = bridge_class(device, 'localhost', 1883, 'bench', engine=engine, **bridge_options)
+    client = bridge._mqtt_client
+    measured = {}
+    injected = []
+
+    def driver():
+        sleep(0.3)
+        published_before = len(client.published)
+        cpu_started_at = process_time()
+        started_at = time()
+        max_timers = 0
+
+        bursts = scenario.get('bursts', 0)
+        for burst in range(bursts):
+            for i in range(scenario['burst_size']):
+                ch = burst * scenario['burst_size'] + i
+                injected.append((time(), ch))
+                client.inject('bench/tx-f/%d' % ch, b'ON')
+            sleep(duration / bursts)
+
+        def queued():
+            return any(len(adapter.tx_queue) for adapter in bridge.adapters)
+
+        # queued commands are part of the measured latency, let them go out
+        while time() - started_at < duration or (queued() and time() - started_at < duration + 60):
+            max_timers = max(max_timers, len(bridge._postponed))
+            sleep(0.05)
+
+        measured['elapsed'] = time() - started_at
+        measured['cpu'] = process_time() - cpu_started_at
+        measured['published'] = len(client.published) - published_before
+        measured['max_timers'] = max_timers
+        measured['started_at'] = started_at
+        if engine == 'asyncio':
+            bridge._loop.call_soon_threadsafe(bridge.stop)
+        else:
+            bridge.stop()
+
+    thread = threading.Thread(target=driver)
+    thread.start()
+    with redirect_stdout(sys.stderr):
+        bridge.loop()
+    thread.join()
+
+    stop.set()
+    emulator = conn.recv()
+    process.join()
+
+    rx_frames = emulator['sent']
+    latencies = []
+    written = {}
+    for t, ch, _cmd in emulator['commands']:
+        written.setdefault(ch, t)
+    for t, ch in injected:
+        if ch in written:
+            latencies.append(written[ch] - t)
+
+    elapsed = measured['elapsed']
+    messages = measured['published'] + len(injected)
+    return {
+        'rx_frames_per_s': rx_frames / elapsed,
+        'published_per_s': measured['published'] / elapsed,
+        'cpu_per_message_us': measured['cpu'] / messages * 1e6 if messages else None,
+        'cpu_load': measured['cpu'] / elapsed,
+        'command_latency_s': percentiles(latencies),
+        'commands_unsent': len(injected) - len(latencies),
+        'max_postponed_timers': measured['max_timers'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--engine', choices=['select', 'poll', 'asyncio'], default='select')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append', default=None)
+    parser.add_argument('--tx-pacing', choices=['fixed', 'response'], default='fixed')
+    parser.add_argument('--echo', choices=['text', 'binary', 'off'], default='text')
+    parser.add_argument('--label', help='Free form label stored with results, e.g. release', default=None)
+    parser.add_argument('--output', help='JSON file to write results to', default=None)
+    args = parser.parse_args()
+
+    result = {
+        'label': args.label,
+        'date': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'engine': args.engine,
+        'tx_pacing': args.tx_pacing,
+        'echo': args.echo,
+        'duration': args.duration,
+        'scenarios': {},
+    }
+    for name in args.scenario or sorted(SCENARIOS):
+        result['scenarios'][name] = run_scenario(name, args.engine, args.duration, {
+            'tx_pacing': args.tx_pacing,
+            'echo': args.echo,
+        })
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+"""
+Compares command frame encoding with the original NooLiteCommand implementation.
+
+Usage: python benchmarks/bench_codec.py [frames]
+"""
+import os
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.enums import Command, Mode, Request  # noqa: E402
+from noolite_mqtt.noolite_serial import NooLiteCommand, encode_frame  # noqa: E402
+
+
+class LegacyNooLiteCommand:
+    def __init__(self, ch, cmd, mode=Mode.TX, ctr=Request.CMD, fmt=0,
+                 d0=0, d1=0, d2=0, d3=0, id0=0, id1=0, id2=0, id3=0):
+        self.st = 171
+        self.mode = mode
+        self.ctr = ctr
+        self.res = 0
+        self.ch = ch
+        self.cmd = cmd
+        self.fmt = fmt
+        self.d0 = d0
+        self.d1 = d1
+        self.d2 = d2
+        self.d3 = d3
+        self.id0 = id0
+        self.id1 = id1
+        self.id2 = id2
+        self.id3 = id3
+        self.sp = 172
+
+    @property
+    def crc(self):
+        crc = sum([self.st, self.mode, self.ctr, self.res, self.ch, self.cmd, self.fmt,
+                   self.d0, self.d1, self.d2, self.d3, self.id0, self.id1, self.id2, self.id3])
+        return crc if crc < 256 else divmod(crc, 256)[1]
+
+    def to_bytes(self):
+        return bytearray([self.st, self.mode, self.ctr, self.res, self.ch, self.cmd, self.fmt,
+                          self.d0, self.d1, self.d2, self.d3, self.id0, self.id1, self.id2, self.id3,
+                          self.crc, self.sp])
+
+
+COMMANDS = [
+    (ch, cmd, mode)
+    for mode in (Mode.TX, Mode.TX_F)
+    for cmd in (Command.ON, Command.OFF, Command.TOGGLE)
+    for ch in range(0, 64, 7)
+]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rounds = max(1, count // len(COMMANDS))
+    total = rounds * len(COMMANDS)
+
+    for ch, cmd, mode in COMMANDS:
+        assert bytes(LegacyNooLiteCommand(ch, cmd, mode).to_bytes()) == encode_frame(ch, cmd, mode)
+
+    def legacy():
+        for ch, cmd, mode in COMMANDS:
+            LegacyNooLiteCommand(ch, cmd, mode).to_bytes()
+
+    def compact():
+        for ch, cmd, mode in COMMANDS:
+            NooLiteCommand(ch, cmd, mode).to_bytes()
+
+    def cached():
+        for ch, cmd, mode in COMMANDS:
+            encode_frame(ch, cmd, mode)
+
+    def brightness():
+        for ch, _cmd, mode in COMMANDS:
+            encode_frame(ch, Command.BRIGHT_SET, mode, fmt=1, d0=ch)
+
+    for name, func in (('legacy class', legacy), ('slots class', compact),
+                       ('frame cache', cached), ('uncached arg', brightness)):
+        elapsed = timeit(func, number=rounds)
+        print('%-12s %8d frames in %.3f s, %10.0f frames/s' % (name, total, elapsed, total / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+"""
+Decodes a synthetic captured frame stream through the original if/elif packet handler
+and through the decoder registry.
+
+Usage: python benchmarks/bench_decoder.py [frames]
+"""
+import os
+import random
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.decoders import Topics, default_decoders  # noqa: E402
+from noolite_mqtt.enums import Command, Mode  # noqa: E402
+
+PREFIX = 'home/noolite'
+
+
+def frame(mode, ch, cmd, d0=0, d1=0, d2=0, d3=0):
+    body = [173, mode, 0, 0, ch, cmd, 0, d0, d1, d2, d3, 0, 0, 0, 0]
+    return bytes(body + [sum(body) & 0xff, 174])
+
+
+def capture(count: int):
+    rnd = random.Random(42)
+    makers = [
+        lambda ch: frame(Mode.RX, ch, Command.SENSOR_TEMP_HUM, rnd.randrange(256), 0x20 | rnd.randrange(16),
+                         rnd.randrange(100), 200),
+        lambda ch: frame(Mode.RX, ch, Command.TEMPORARY_ON, 36),
+        lambda ch: frame(Mode.RX, ch, Command.OFF),
+        lambda ch: frame(Mode.RX_F, ch, Command.TOGGLE),
+        lambda ch: frame(Mode.TX_F, ch, Command.SEND_STATE, 0, 0, 1, 200),
+    ]
+    return [rnd.choice(makers)(rnd.randrange(64)) for _ in range(count)]
+
+
+class Sink:
+    """Stand-in for the bridge side used by decoders"""
+
+    def __init__(self):
+        self.topics = Topics(PREFIX)
+        self.temperature_deadband = self.humidity_deadband = self.battery_deadband = 0.0
+        self.published = 0
+        self.postponed = {}
+
+    def publish(self, topic, payload, retain=False):
+        self.published += 1
+
+    def publish_state(self, topic, payload, value=None, deadband=0.0, retain=False):
+        self.published += 1
+
+    def postpone(self, topic, delay, payload):
+        self.postponed[topic] = payload
+
+    def cancel_postponed(self, topic):
+        self.postponed.pop(topic, None)
+
+
+def legacy_on_packet(sink, packet):
+    mode = packet[1]
+    ch = packet[4]
+    cmd = packet[5]
+    sink.publish('%s/echo/%d' % (PREFIX, ch), '[%s]' % ','.join([str(b) for b in packet]))
+    if mode == Mode.TX_F:
+        if cmd == Command.SEND_STATE:
+            state = packet[9] & 0x0f
+            brightness = packet[10] & 0xff
+            sink.publish('%s/state-f/%d' % (PREFIX, ch), 'ON' if state > 0 else 'OFF', retain=True)
+            sink.publish('%s/state-f/%d/brightness' % (PREFIX, ch), str(brightness), retain=True)
+    elif mode == Mode.RX or mode == Mode.RX_F:
+        if cmd == Command.TEMPORARY_ON or cmd == Command.ON or cmd == Command.OFF:
+            switch_topic = '%s/switch/%d' % (PREFIX, ch)
+            sink.publish(switch_topic, 'ON' if cmd != Command.OFF else 'OFF')
+            sink.cancel_postponed(switch_topic)
+            if cmd == Command.TEMPORARY_ON:
+                sink.postpone(switch_topic, packet[7] * 5, 'OFF')
+        elif cmd == Command.TOGGLE:
+            sink.publish('%s/button/%d' % (PREFIX, ch), 'TOGGLE')
+        elif cmd == Command.SENSOR_TEMP_HUM:
+            deci_temp = packet[7] | ((packet[8] & 0x0f) << 8)
+            if deci_temp & 0x0800:
+                from ctypes import c_int16
+                deci_temp = c_int16(deci_temp | 0xf000).value
+            temp = deci_temp / 10.0
+            hum = packet[9]
+            battery = packet[10] / 50.0
+            sink.publish('%s/temperature/%d' % (PREFIX, ch), '%.1f' % temp)
+            sink.publish('%s/humidity/%d' % (PREFIX, ch), '%d' % hum)
+            sink.publish('%s/battery/%d' % (PREFIX, ch), '%.2f' % battery)
+        elif cmd == Command.BATTERY_LOW:
+            sink.publish('%s/battery/%d' % (PREFIX, ch), '0')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    frames = capture(count)
+    decoders = default_decoders()
+
+    def legacy():
+        sink = Sink()
+        for packet in frames:
+            legacy_on_packet(sink, packet)
+
+    def registry():
+        sink = Sink()
+        for packet in frames:
+            ch = packet[4]
+            sink.publish(sink.topics.echo[ch], '[%s]' % ','.join([str(b) for b in packet]))
+            decoder = decoders.get(packet[1], packet[5])
+            if decoder is not None:
+                decoder(sink, ch, packet)
+
+    for name, func in (('if/elif', legacy), ('registry', registry)):
+        elapsed = timeit(func, number=1)
+        print('%-8s %8d frames in %.3f s, %10.0f frames/s' % (name, count, elapsed, count / elapsed))
+
+
+if __name__ == '__main__':
+    main()
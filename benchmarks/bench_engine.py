@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+"""
+Measures idle CPU usage and RX frame to MQTT publish latency of the main loop engines.
+
+The serial side is a pseudo-terminal, the MQTT client is replaced with a stand-in
+which keeps an idle socket and records publish times, so no broker is needed.
+
+Usage: python benchmarks/bench_engine.py [idle_seconds] [frames]
+"""
+import os
+import pty
+import sys
+import threading
+import tty
+from time import monotonic as time, process_time, sleep
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import noolite_mqtt  # noqa: E402
+from noolite_mqtt.aio import AsyncNooLiteMQTT  # noqa: E402
+from noolite_mqtt.enums import Command, Mode  # noqa: E402
+from standin import StandInClient  # noqa: E402
+
+
+def run(engine: str, idle_seconds: float, frames: int):
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    noolite_mqtt.mqtt.Client = StandInClient
+    bridge_class = AsyncNooLiteMQTT if engine == 'asyncio' else noolite_mqtt.NooLiteMQTT
+    bridge = bridge_class(os.ttyname(slave), 'localhost', 1883, 'bench', engine=engine)
+    client = bridge._mqtt_client
+    body = [173, Mode.RX, 0, 0, 1, Command.TOGGLE, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+    frame = bytes(body + [sum(body) & 0xff, 174])
+    result = {}
+
+    def feeder():
+        sleep(0.2)
+        cpu_started_at = process_time()
+        sleep(idle_seconds)
+        result['idle_cpu'] = (process_time() - cpu_started_at) / idle_seconds
+
+        latencies = []
+        for i in range(frames):
+            published = len(client.published)
+            sent_at = time()
+            os.write(master, frame)
+            while len(client.published) == published and time() - sent_at < 2.0:
+                sleep(0.0005)
+            latencies.append(client.published[-1][0] - sent_at if len(client.published) > published else 2.0)
+            sleep(0.05 + (i % 7) * 0.03)
+
+        latencies.sort()
+        result['latency_avg'] = sum(latencies) / len(latencies)
+        result['latency_p50'] = latencies[len(latencies) // 2]
+        result['latency_max'] = latencies[-1]
+        if engine == 'asyncio':
+            bridge._loop.call_soon_threadsafe(bridge.stop)
+        else:
+            bridge.stop()
+
+    thread = threading.Thread(target=feeder)
+    thread.start()
+    bridge.loop()
+    thread.join()
+    os.close(master)
+    return result
+
+
+def main():
+    idle_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+    for engine in ('poll', 'select', 'asyncio'):
+        result = run(engine, idle_seconds, frames)
+        print('%-6s idle CPU %5.1f%%, RX to publish latency avg %.1f ms, p50 %.1f ms, max %.1f ms' % (
+            engine, result['idle_cpu'] * 100,
+            result['latency_avg'] * 1000, result['latency_p50'] * 1000, result['latency_max'] * 1000,
+        ))
+
+
+if __name__ == '__main__':
+    main()
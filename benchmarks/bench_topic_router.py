@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+"""
+Compares TopicRouter with the regex chain previously used in NooLiteMQTT._on_message.
+
+Usage: python benchmarks/bench_topic_router.py [messages]
+"""
+import os
+import re
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.topic_router import TopicRouter  # noqa: E402
+
+PREFIX = 'home/noolite'
+
+MESSAGES = [
+    ('%s/tx/1' % PREFIX, b'ON'),
+    ('%s/tx-f/12' % PREFIX, b'TOGGLE'),
+    ('%s/tx/3/BRIGHTNESS' % PREFIX, b'100'),
+    ('%s/tx-f/4/BRIGHTNESS' % PREFIX, b'42'),
+    ('%s/bind/5' % PREFIX, b'1'),
+    ('%s/bind-f/6' % PREFIX, b'0'),
+    ('%s/unknown/7' % PREFIX, b'ON'),
+]
+
+
+def regex_chain(topic: str, payload: bytes, sink: list):
+    tx_match = re.match('%s/tx/(\\d+)' % PREFIX, topic)
+    if tx_match:
+        sink.append((int(tx_match.group(1)), payload.decode()))
+    tx_match = re.match('%s/tx-f/(\\d+)' % PREFIX, topic)
+    if tx_match:
+        sink.append((int(tx_match.group(1)), payload.decode()))
+    tx_match = re.match('%s/tx/(\\d+)/([A-Z]+)' % PREFIX, topic)
+    if tx_match:
+        sink.append((int(tx_match.group(1)), str(tx_match.group(2)), int(payload.decode())))
+    tx_match = re.match('%s/tx-f/(\\d+)/([A-Z]+)' % PREFIX, topic)
+    if tx_match:
+        sink.append((int(tx_match.group(1)), str(tx_match.group(2)), int(payload.decode())))
+    bind_match = re.match('%s/bind/(\\d+)' % PREFIX, topic)
+    if bind_match:
+        sink.append((int(bind_match.group(1)), payload.decode()))
+    bind_match = re.match('%s/bind-f/(\\d+)' % PREFIX, topic)
+    if bind_match:
+        sink.append((int(bind_match.group(1)), payload.decode()))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rounds = max(1, count // len(MESSAGES))
+    sink = []
+
+    def handler(ch, sub, payload):
+        sink.append((ch, sub, payload))
+
+    router = TopicRouter(PREFIX)
+    for route in ('tx', 'tx-f', 'bind', 'bind-f'):
+        router.add(route, handler)
+
+    def run_regex():
+        for topic, payload in MESSAGES:
+            regex_chain(topic, payload, sink)
+
+    def run_router():
+        for topic, payload in MESSAGES:
+            router.route(topic, payload.decode())
+
+    total = rounds * len(MESSAGES)
+    for name, func in (('regex chain', run_regex), ('topic router', run_router)):
+        sink.clear()
+        elapsed = timeit(func, number=rounds)
+        print('%-12s %8d msg in %.3f s, %10.0f msg/s' % (name, total, elapsed, total / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+In-process stand-in for paho.mqtt.client.Client used by the benchmarks.
+
+It keeps a socket pair so the bridge engines can wait on a real socket, records
+published messages with their time and delivers injected messages through
+on_message when the bridge services the socket, like a broker connection would.
+"""
+import select
+import socket
+import threading
+from collections import deque
+from time import monotonic as time
+
+import paho.mqtt.client as mqtt
+
+
+class StandInMessage:
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+
+
+class StandInClient:
+    def __init__(self, *_args, **_kwargs):
+        self._sock, self._peer = socket.socketpair()
+        self._sock.setblocking(False)
+        self._inbox = deque()
+        self._lock = threading.Lock()
+        self.published = []
+        self.on_connect = self.on_disconnect = self.on_message = None
+
+    def username_pw_set(self, *_args):
+        pass
+
+    def will_set(self, *_args, **_kwargs):
+        pass
+
+    def connect(self, *_args, **_kwargs):
+        pass
+
+    def subscribe(self, *_args, **_kwargs):
+        pass
+
+    def publish(self, topic, payload=None, *_args, **_kwargs):
+        self.published.append((time(), topic, payload))
+        return mqtt.MQTTMessageInfo(len(self.published))
+
+    def inject(self, topic: str, payload: bytes):
+        """Delivers a message to the bridge, may be called from another thread"""
+        with self._lock:
+            self._inbox.append((time(), StandInMessage(topic, payload)))
+        self._peer.send(b'.')
+
+    def socket(self):
+        return self._sock
+
+    def want_write(self):
+        return False
+
+    def loop(self, timeout=1.0):
+        readable, _, _ = select.select([self._sock], [], [], timeout)
+        if readable:
+            self.loop_read()
+
+    def loop_read(self):
+        try:
+            self._sock.recv(4096)
+        except BlockingIOError:
+            pass
+        while True:
+            with self._lock:
+                if not self._inbox:
+                    break
+                _, message = self._inbox.popleft()
+            self.on_message(self, None, message)
+
+    def loop_write(self):
+        pass
+
+    def loop_misc(self):
+        pass
@@ -1,12 +1,33 @@
 import argparse
-import re
+import importlib
+import json
+import selectors
 import signal
-from time import sleep, monotonic as time
+import socket
+import threading
+from functools import partial
+from time import monotonic as time, process_time, sleep
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
 import paho.mqtt.client as mqtt
 
 from noolite_mqtt.noolite_serial import NooLiteSerial
-from .enums import Command, Mode, Request
+from .adapter import Adapter
+from .aggregate import WindowAggregator
+from .auto_discovery import AutoDiscovery
+from .decoders import CHANNELS, Topics, default_decoders
+from .echo import ECHO_BINARY, ECHO_OFF, ECHO_TEXT, Echo, parse_echo_filter
+from .enums import Command, Mode, Request, Response
+from .groups import load_groups
+from .metrics import LOOP_BUCKETS, Metrics, MetricsServer, mode_command_labels, per_adapter
+from .outbox import DROP_COALESCE, DROP_OLDEST, Outbox
+from .snapshot import Snapshot
+from .pending import RESULT_TIMEOUT
+from .poller import StatePoller, channel_ranges
+from .state_cache import PublishCache
+from .timers import TimerQueue
+from .topic_router import TopicRouter
+from .tx_queue import PACING_FIXED, PACING_RESPONSE, PRIORITY_AUTOMATION, PRIORITY_BACKGROUND, TxRequest
 
 COMMANDS = {
     'OFF': Command.OFF,
@@ -35,6 +56,9 @@ F_COMMANDS_FMT1 = {
     'BRIGHTNESS': Command.BRIGHT_SET,
 }
 
+# timeout of the TCP connect probing the broker before a reconnect, seconds
+PROBE_TIMEOUT = 10.0
+
 BOOLEANS = {
     '1': True,
     'ON': True,
@@ -44,12 +68,55 @@ BOOLEANS = {
 
 
 class NooLiteMQTT:
-    def __init__(self, serial_device: str, mqtt_host: str,
+    serial_class = NooLiteSerial
+    # main loop engines run by loop()
+    engines = ('select', 'poll')
+
+    def __init__(self, serial_device: Union[str, Sequence[str]], mqtt_host: str,
                  mqtt_port: int, mqtt_prefix: str,
-                 username: str=None, password: str=None):
-        self._noo_serial = NooLiteSerial(serial_device)
+                 username: str=None, password: str=None,
+                 tx_interval: float = 0.3, tx_queue_size: int = 64,
+                 tx_pacing: str = PACING_FIXED, tx_response_timeout: float = 0.5, tx_gap: float = 0.1,
+                 tx_rate: float = None, tx_burst: float = 5.0,
+                 tx_f_attempts: int = 3, tx_f_timeout: float = 1.0, tx_f_backoff: float = 0.5,
+                 echo: str = ECHO_TEXT, echo_sample: int = 1, echo_filter: List[Tuple] = None,
+                 echo_aggregate: bool = False,
+                 publish_on_change: bool = False, publish_max_interval: float = 300.0,
+                 temperature_deadband: float = 0.0, humidity_deadband: float = 0.0, battery_deadband: float = 0.0,
+                 engine: str = 'select', metrics_port: int = None, metrics_host: str = '127.0.0.1',
+                 auto_discovery: bool = False, auto_discovery_state: str = None,
+                 outbox_size: int = 1000, outbox_policy: str = DROP_OLDEST,
+                 reconnect_min_delay: float = 1.0, reconnect_max_delay: float = 60.0,
+                 snapshot: str = None, snapshot_interval: float = 1.0,
+                 poll_channels: List[int] = None, poll_period: float = 300.0, groups: str = None,
+                 aggregate_seconds: float = None, aggregate_samples: int = None,
+                 aggregate_channels: List[int] = None, aggregate_raw: bool = True):
+        if engine not in self.engines:
+            if engine == 'asyncio':
+                raise ValueError('asyncio engine is run by noolite_mqtt.aio.AsyncNooLiteMQTT')
+            raise ValueError('Unknown engine: %s' % engine)
+
+        # every adapter serves the next 64 channels
+        devices = [serial_device] if isinstance(serial_device, str) else serial_device
+        tx_options = {
+            'interval': tx_interval, 'max_size': tx_queue_size, 'pacing': tx_pacing,
+            'response_timeout': tx_response_timeout, 'tx_gap': tx_gap, 'rate': tx_rate, 'burst': tx_burst,
+        }
+        tx_f_options = {'max_attempts': tx_f_attempts, 'timeout': tx_f_timeout, 'backoff': tx_f_backoff}
+        self._adapters = [
+            Adapter(index, self.serial_class(device), self._on_tx_result, tx_options, tx_f_options)
+            for index, device in enumerate(devices)
+        ]
 
         self._mqtt_prefix = mqtt_prefix
+        self._groups, self._scenes = load_groups(groups) if groups is not None else ({}, {})
+        self._router = self._build_router()
+        self.topics = Topics(mqtt_prefix, CHANNELS * len(self._adapters))
+        self.decoders = default_decoders()
+        self._echo = None if echo == ECHO_OFF else Echo(
+            mqtt_prefix, self.topics.echo, echo, echo_sample, echo_filter, echo_aggregate
+        )
+        self._discovery = AutoDiscovery(mqtt_prefix, state_file=auto_discovery_state) if auto_discovery else None
 
         self._mqtt_client = mqtt.Client()
         self._mqtt_client.on_connect = self._on_connect
@@ -59,220 +126,681 @@ class NooLiteMQTT:
         if username is not None and username != '':
             self._mqtt_client.username_pw_set(username, password)
 
-        self._postponed = []
-
+        self._postponed = TimerQueue()
+
+        self._publish_cache = PublishCache(publish_max_interval) if publish_on_change else None
+        self.temperature_deadband = temperature_deadband
+        self.humidity_deadband = humidity_deadband
+        self.battery_deadband = battery_deadband
+
+        # sensor values may also be published as per window min/max/mean/last
+        self._aggregator = None
+        self._aggregate_raw = aggregate_raw
+        if aggregate_seconds is not None or aggregate_samples is not None:
+            channels = range(len(self.topics)) if aggregate_channels is None else [
+                ch for ch in aggregate_channels if ch < len(self.topics)
+            ]
+            self._aggregator = WindowAggregator(
+                [topics[ch] for topics in (self.topics.temperature, self.topics.humidity, self.topics.battery)
+                 for ch in channels],
+                aggregate_seconds, aggregate_samples
+            )
+
+        self._poller = None
+        if poll_channels:
+            self._poller = StatePoller(
+                [ch for ch in poll_channels if self._adapter(ch) is not None],
+                self._poll_request, self._poll_busy, poll_period
+            )
+
+        self._snapshot = None
+        if snapshot is not None:
+            self._snapshot = Snapshot(snapshot, self.topics, snapshot_interval)
+            self._restore_snapshot()
+
+        # publishes made while the broker is away wait in the outbox
+        self._outbox = Outbox(outbox_size, outbox_policy)
+        self._connected = False
+        self._reconnect_at = None
+        self._reconnect_min_delay = reconnect_min_delay
+        self._reconnect_max_delay = reconnect_max_delay
+        self._reconnect_delay = reconnect_min_delay
+        self._mqtt_address = (mqtt_host, mqtt_port)
+        # None while no probe is running, then True or the connect error, set by the probe thread
+        self._probe = None
+        self._probe_result = None
+
+        self._engine = engine
+        self._loop_iterations = 0
         self._exit = False
 
+        self._metrics = None
+        self._metrics_server = None
+        if metrics_port is not None:
+            self._setup_metrics(metrics_port, metrics_host)
+
         self._mqtt_client.will_set('%s/LWT' % self._mqtt_prefix, 'Offline', 0, True)
         self._mqtt_client.connect(mqtt_host, mqtt_port, 60)
+        # CONNECT is the first packet on the socket, so publishing can start right away
+        self._connected = True
 
     def loop(self):
         signal.signal(signal.SIGINT, self._interrupt_handler)
         signal.signal(signal.SIGTERM, self._interrupt_handler)
 
-        self._mqtt_client.publish('%s/LWT' % self._mqtt_prefix, 'Online', 0, True)
+        self.publish('%s/LWT' % self._mqtt_prefix, 'Online', retain=True)
+
+        started_at = time()
+        cpu_started_at = process_time()
+
+        if self._engine == 'select' and all(adapter.fileno() is not None for adapter in self._adapters):
+            self._select_loop()
+        else:
+            self._poll_loop()
+
+        if self._snapshot is not None:
+            self._snapshot.close()
+
+        self._print_stats(time() - started_at, process_time() - cpu_started_at)
+
+    def stop(self):
+        """Makes the running loop exit"""
+        self._exit = True
 
+    def _poll_loop(self):
         while not self._exit:
+            self._loop_iterations += 1
+            started_at = time()
+
             # first receive packets from noolite serial
-            packets = self._noo_serial.receive()
-            for packet in packets:
-                self._on_packet(packet)
-
-            # here we work with postponed messages
-            postponed = []
-            for (trigger_time, topic, payload) in self._postponed:
-                if trigger_time < time():
-                    self._mqtt_client.publish(topic, payload)
-                else:
-                    postponed.append((trigger_time, topic, payload))
-            self._postponed = postponed
-
-            # here we run MQTT loop
-            self._mqtt_client.loop()
-
-    def _interrupt_handler(self, _signal, _frame):
+            for adapter in self._adapters:
+                self._receive_packets(adapter)
+
+            # here we work with postponed messages and queued commands
+            self._process_timers()
+
+            if self._metrics is not None:
+                self._loop_time.observe(time() - started_at)
+
+            # here we run MQTT loop, waking up in time for the next queued command or postponed message
+            if self._mqtt_client.loop(self._loop_timeout()) == mqtt.MQTT_ERR_NO_CONN:
+                # there is no socket to wait on until reconnected
+                sleep(self._loop_timeout())
+
+    def _select_loop(self):
+        selector = selectors.DefaultSelector()
+        for adapter in self._adapters:
+            selector.register(adapter.fileno(), selectors.EVENT_READ, adapter)
+
+        mqtt_socket = None
+        mqtt_events = 0
+        try:
+            while not self._exit:
+                self._loop_iterations += 1
+
+                # MQTT socket may change on reconnect and we only wait for write when paho has data to send
+                sock = self._mqtt_client.socket()
+                events = selectors.EVENT_READ
+                if self._mqtt_client.want_write():
+                    events |= selectors.EVENT_WRITE
+                if sock is not mqtt_socket:
+                    if mqtt_socket is not None:
+                        selector.unregister(mqtt_socket)
+                    if sock is not None:
+                        selector.register(sock, events)
+                    mqtt_socket, mqtt_events = sock, events
+                elif sock is not None and events != mqtt_events:
+                    selector.modify(sock, events)
+                    mqtt_events = events
+
+                ready = selector.select(self._loop_timeout())
+                started_at = time()
+                for key, mask in ready:
+                    if key.fileobj is mqtt_socket:
+                        if mask & selectors.EVENT_READ:
+                            self._mqtt_client.loop_read()
+                        if mask & selectors.EVENT_WRITE:
+                            self._mqtt_client.loop_write()
+                    else:
+                        self._receive_packets(key.data)
+
+                self._mqtt_client.loop_misc()
+                self._process_timers()
+
+                if self._metrics is not None:
+                    self._loop_time.observe(time() - started_at)
+        finally:
+            selector.close()
+
+    def _loop_timeout(self) -> float:
+        # MQTT keepalive is serviced at least once a second
+        timeout = 1.0
+        deadline = self._next_deadline()
+        if deadline is not None:
+            timeout = max(0.0, min(timeout, deadline - time()))
+        return timeout
+
+    def _receive_packets(self, adapter: Adapter):
+        for packet in adapter.receive():
+            self._on_packet(adapter, packet)
+
+    def _process_timers(self):
+        now = time()
+        if self._reconnect_at is not None and now >= self._reconnect_at:
+            self._reconnect(now)
+        if self._probe_result is not None:
+            self._on_probe_result(now)
+
+        for topic, payload in self._postponed.pop_expired(now):
+            if self._snapshot is not None:
+                self._snapshot.clear_timer(topic)
+            self.publish(topic, payload)
+
+        # nooLite-F retries and queued commands, paced per adapter
+        for adapter in self._adapters:
+            adapter.process(now)
+
+        if self._poller is not None:
+            self._poller.process(now)
+
+        if self._aggregator is not None:
+            for topic, payload in self._aggregator.process(now):
+                self.publish(topic, payload)
+
+        if self._snapshot is not None:
+            self._snapshot.process(now)
+
+    @property
+    def adapters(self) -> List[Adapter]:
+        return self._adapters
+
+    def _adapter(self, ch: int) -> Optional[Adapter]:
+        """Adapter serving bridge channel ch"""
+        index = ch // CHANNELS
+        return self._adapters[index] if index < len(self._adapters) else None
+
+    def _next_deadline(self):
+        deadlines = [
+            deadline
+            for deadline in [
+                self._postponed.next_deadline(),
+                self._reconnect_at,
+                self._snapshot.next_flush() if self._snapshot is not None else None,
+                self._poller.next_deadline() if self._poller is not None else None,
+                self._aggregator.next_deadline() if self._aggregator is not None else None,
+            ] + [adapter.next_deadline() for adapter in self._adapters]
+            if deadline is not None
+        ]
+        return min(deadlines) if deadlines else None
+
+    def _print_stats(self, wall_time: float, cpu_time: float):
+        print('Loop stats: %d iterations, %.2f s CPU in %.1f s' % (self._loop_iterations, cpu_time, wall_time))
+        for adapter in self._adapters:
+            adapter.print_stats()
+        if self._publish_cache is not None:
+            print('Publish cache stats: %s' % self._publish_cache.stats())
+        print('Outbox stats: %s' % self._outbox.stats())
+        if self._poller is not None:
+            print('State poller stats: %s' % self._poller.stats())
+        if self._aggregator is not None:
+            print('Aggregation stats: %s' % self._aggregator.stats())
+
+    def _setup_metrics(self, port: int, host: str):
+        metrics = Metrics()
+        self._frames_received = metrics.counter(
+            'frames_received_total', 'Frames received from the adapter', ('mode', 'command'), mode_command_labels
+        )
+        self._frames_sent = metrics.counter(
+            'frames_sent_total', 'Frames written to the adapter', ('mode', 'command'), mode_command_labels
+        )
+        adapters = self._adapters
+        metrics.collected('serial_crc_errors_total', 'Received frames with invalid checksum', 'counter',
+                          per_adapter(adapters, lambda adapter: adapter.serial.stats()['crc_errors']), ('adapter',))
+        metrics.collected('serial_resyncs_total', 'Resynchronisations on the frame start byte', 'counter',
+                          per_adapter(adapters, lambda adapter: adapter.serial.stats()['resyncs']), ('adapter',))
+        metrics.collected('tx_queue_depth', 'Commands waiting to be written to serial', 'gauge',
+                          per_adapter(adapters, lambda adapter: len(adapter.tx_queue)), ('adapter',))
+        metrics.collected('tx_queue_dropped_total', 'Commands dropped because the TX queue was full', 'counter',
+                          per_adapter(adapters, lambda adapter: adapter.tx_queue.dropped), ('adapter',))
+        metrics.collected('tx_queue_coalesced_total', 'Commands merged into a queued command for the channel',
+                          'counter', per_adapter(adapters, lambda adapter: adapter.tx_queue.coalesced), ('adapter',))
+        metrics.collected('tx_queue_wait_avg_seconds', 'Average time commands waited in the TX queue', 'gauge',
+                          lambda: [
+                              ((adapter.index, name), stats['wait_avg'])
+                              for adapter in adapters
+                              for name, stats in adapter.tx_queue.stats()['classes'].items()
+                          ], ('adapter', 'class'))
+        metrics.collected('tx_f_pending', 'nooLite-F commands waiting for the result', 'gauge',
+                          per_adapter(adapters, lambda adapter: len(adapter.pending)), ('adapter',))
+        self._tx_response_time = metrics.histogram(
+            'tx_f_response_seconds', 'Time from serial write to the adapter answer of nooLite-F commands'
+        )
+        metrics.gauge_func('postponed_timers', 'Postponed messages waiting to be published', self._postponed.__len__)
+        self._mqtt_published = metrics.counter('mqtt_published_total', 'Messages passed to the MQTT client')
+        self._mqtt_sent = metrics.counter('mqtt_sent_total', 'Messages written to the MQTT broker connection')
+        # mid -> QoS of published messages without on_publish yet, and mids whose
+        # on_publish came before publish() returned them
+        self._in_flight = {}
+        self._sent_early = set()
+        metrics.gauge_func('mqtt_in_flight', 'Published messages not yet written or acknowledged',
+                           lambda: len(self._in_flight))
+        metrics.gauge_func('outbox_depth', 'Messages waiting for the broker connection', self._outbox.__len__)
+        metrics.collected('outbox_dropped_total', 'Messages dropped because the outbox was full', 'counter',
+                          lambda: [((), self._outbox.dropped)])
+        metrics.collected('outbox_coalesced_total', 'Buffered messages replaced by a newer one to the same topic',
+                          'counter', lambda: [((), self._outbox.coalesced)])
+        metrics.gauge_func('mqtt_connected', 'Whether the broker connection is up', lambda: int(self._connected))
+        self._loop_time = metrics.histogram(
+            'loop_iteration_seconds', 'Time spent on handling events per main loop iteration', LOOP_BUCKETS
+        )
+
+        for adapter in adapters:
+            adapter.tx_queue.on_sent = partial(self._on_sent, adapter)
+        self._mqtt_client.on_publish = self._on_publish
+        self._metrics = metrics
+        self._metrics_server = MetricsServer(metrics, port, host).start()
+
+    def _poll_request(self, ch: int):
+        adapter = self._adapter(ch)
+        adapter.tx_queue.put(ch - adapter.offset, Command.READ_STATE, mode=Mode.TX_F, priority=PRIORITY_BACKGROUND)
+
+    def _poll_busy(self, ch: int) -> bool:
+        # user commands waiting for the adapter go first
+        return self._adapter(ch).tx_queue.depth(PRIORITY_AUTOMATION) > 0
+
+    def _restore_snapshot(self):
+        values = self._snapshot.values()
+        if self._publish_cache is not None:
+            # values known before restart are not published again until they change
+            for topic, value in values:
+                self._publish_cache.should_publish(topic, value)
+
+        # motion sensors still go OFF in time, expired messages go out right away
+        timers = self._snapshot.timers()
+        now = time()
+        for topic, left, payload in timers:
+            self._postponed.schedule(topic, now + max(0.0, left), payload)
+        print('Restored %d values and %d postponed messages' % (len(values), len(timers)))
+
+    def _interrupt_handler(self, _signal=None, _frame=None):
         print('Exiting loop...')
-        self._exit = True
+        self.stop()
 
     # The callback for when the client receives a CONNACK response
     def _on_connect(self, client: mqtt.Client, _user_data, _flags, rc: int):
         print('Connected with result code %d' % rc)
+        if rc != 0:
+            # protocol, client id or credentials were refused, retrying won't help
+            print('Connection refused: %s' % mqtt.connack_string(rc))
+            self.stop()
+            return
+
+        self._reconnect_delay = self._reconnect_min_delay
+        if not self._connected:
+            # the broker has published our will meanwhile
+            self._connected = True
+            self._send('%s/LWT' % self._mqtt_prefix, 'Online', 0, True)
+            self._flush_outbox()
 
         # Subscribing in on_connect() means that if we lose the connection and
         # reconnect then subscriptions will be renewed.
-        client.subscribe([
-            ('%s/tx/#' % self._mqtt_prefix, 0),
-            ('%s/tx-f/#' % self._mqtt_prefix, 0),
-            ('%s/bind/#' % self._mqtt_prefix, 0),
-            ('%s/bind-f/#' % self._mqtt_prefix, 0)
-        ])
+        client.subscribe(self._router.subscriptions())
 
     def _on_disconnect(self, _client: mqtt.Client, _user_data, rc: int):
-        self._exit = True
-        if rc != 0:
-            print("Unexpected disconnection.")
+        self._connected = False
+        if self._metrics is not None:
+            # paho drops unwritten QoS 0 messages on reconnect, only QoS > 0 ones are resent
+            self._in_flight = {mid: qos for mid, qos in self._in_flight.items() if qos > 0}
+            self._sent_early.clear()
+        if rc == 0 or self._exit:
+            self.stop()
+            return
+        if self._reconnect_at is None and self._probe is None:
+            print('Unexpected disconnection, reconnecting in %.1f s' % self._reconnect_delay)
+            self._schedule_reconnect(time())
+
+    def _schedule_reconnect(self, now: float):
+        # the delay is reset by a successful CONNACK
+        self._reconnect_at = now + self._reconnect_delay
+        self._reconnect_delay = min(self._reconnect_delay * 2, self._reconnect_max_delay)
+
+    def _reconnect(self, now: float):
+        # paho connects with a blocking socket, so the broker is probed on a helper thread
+        # first and the loop only calls reconnect() once the broker accepts connections
+        self._reconnect_at = None
+        self._probe = threading.Thread(target=self._probe_broker, name='mqtt-probe', daemon=True)
+        self._probe.start()
+
+    def _probe_broker(self):
+        try:
+            socket.create_connection(self._mqtt_address, PROBE_TIMEOUT).close()
+            self._probe_result = True
+        except OSError as e:
+            self._probe_result = e
+        self._probe_done()
+
+    def _probe_done(self):
+        """Called on the probe thread, the loops look at the result at least once a second"""
+
+    def _on_probe_result(self, now: float):
+        result, self._probe_result, self._probe = self._probe_result, None, None
+        if result is True:
+            try:
+                self._mqtt_client.reconnect()
+                # CONNACK calls _on_connect which flushes the outbox, losing the connection calls _on_disconnect
+                return
+            except (OSError, ValueError) as e:
+                result = e
+        print('Reconnect failed: %s, next attempt in %.1f s' % (result, self._reconnect_delay))
+        self._schedule_reconnect(now)
+
+    def _flush_outbox(self):
+        flushed = 0
+        for topic, payload, qos, retain in self._outbox.drain():
+            self._send(topic, payload, qos, retain)
+            flushed += 1
+        if flushed:
+            print('Published %d buffered messages' % flushed)
+
+    def _send(self, topic: str, payload, qos: int = 0, retain: bool = False) -> int:
+        """Passes a message to the MQTT client counting it in metrics, returns the client result code"""
+        info = self._mqtt_client.publish(topic, payload, qos, retain)
+        if self._metrics is not None and info.rc != mqtt.MQTT_ERR_NO_CONN:
+            self._mqtt_published.inc()
+            if info.mid in self._sent_early:
+                self._sent_early.discard(info.mid)
+            else:
+                self._in_flight[info.mid] = qos
+        return info.rc
 
     # The callback for when a PUBLISH message is received from the server.
     def _on_message(self, _client: mqtt.Client, _user_data, msg: mqtt.MQTTMessage):
-        print(msg.topic + ': ' + msg.payload.decode())
-
-        tx_match = re.match('%s/tx/(\\d+)' % self._mqtt_prefix, msg.topic)
-        if tx_match:
-            ch = int(tx_match.group(1))
-            cmd = msg.payload.decode()
-            if cmd in COMMANDS:
-                self._noo_serial.send_command(ch, COMMANDS[cmd], mode=Mode.TX)
-                sleep(0.3)
-
-        tx_match = re.match('%s/tx-f/(\\d+)' % self._mqtt_prefix, msg.topic)
-        if tx_match:
-            ch = int(tx_match.group(1))
-            cmd = msg.payload.decode()
-            if cmd in F_COMMANDS:
-                self._noo_serial.send_command(ch, F_COMMANDS[cmd], mode=Mode.TX_F)
-                sleep(0.3)
-
-        tx_match = re.match(
-            '%s/tx/(\\d+)/([A-Z]+)' % self._mqtt_prefix, msg.topic
-        )
-        if tx_match:
-            ch = int(tx_match.group(1))
-            cmd = str(tx_match.group(2))
-            if cmd in COMMANDS_FMT1:
-                arg = int(msg.payload.decode())
-                self._noo_serial.send_command(ch, COMMANDS_FMT1[cmd], mode=Mode.TX, fmt=1, d0=arg)
-                sleep(0.3)
-
-        tx_match = re.match(
-            '%s/tx-f/(\\d+)/([A-Z]+)' % self._mqtt_prefix, msg.topic
-        )
-        if tx_match:
-            ch = int(tx_match.group(1))
-            cmd = str(tx_match.group(2))
-            if cmd in F_COMMANDS_FMT1:
-                arg = int(msg.payload.decode())
-                self._noo_serial.send_command(ch, F_COMMANDS_FMT1[cmd], mode=Mode.TX_F, fmt=1, d0=arg)
-                sleep(0.3)
-
+        payload = msg.payload.decode()
+        print(msg.topic + ': ' + payload)
+
+        self._router.route(msg.topic, payload)
+
+    def _build_router(self) -> TopicRouter:
+        router = TopicRouter(self._mqtt_prefix)
+        self._tx_handlers = {
+            'tx': self._tx_handler(Mode.TX, COMMANDS, COMMANDS_FMT1),
+            'tx-f': self._tx_handler(Mode.TX_F, F_COMMANDS, F_COMMANDS_FMT1),
+        }
+        for route, handler in self._tx_handlers.items():
+            router.add(route, handler)
+        if self._groups:
+            router.add('group', self._group_handler, named=True)
+        if self._scenes:
+            router.add('scene', self._scene_handler, named=True)
         # RX BIND
-        bind_match = re.match('%s/bind/(\\d+)' % self._mqtt_prefix, msg.topic)
-        if bind_match:
-            ch = int(bind_match.group(1))
-            bind_en = msg.payload.decode()
-            if bind_en in BOOLEANS:
-                self._noo_serial.send_command(
-                    ch,
-                    Command.OFF,
-                    mode=Mode.RX,
-                    ctr=Request.BIND_START if BOOLEANS[bind_en] else Request.BIND_STOP
-                )
-                sleep(0.3)
-
-        bind_match = re.match('%s/bind-f/(\\d+)' % self._mqtt_prefix, msg.topic)
-        if bind_match:
-            ch = int(bind_match.group(1))
-            bind_en = msg.payload.decode()
-            if bind_en in BOOLEANS:
-                self._noo_serial.send_command(
-                    ch,
+        router.add('bind', self._bind_handler(Mode.RX))
+        router.add('bind-f', self._bind_handler(Mode.RX_F))
+        return router
+
+    def _tx_handler(self, mode: Mode, commands: Dict[str, Command], commands_fmt1: Dict[str, Command]):
+        def handler(ch: int, sub: str, payload: str, burst: bool = False):
+            adapter = self._adapter(ch)
+            if adapter is None:
+                return
+            ch -= adapter.offset
+            if sub is None:
+                if payload in commands:
+                    adapter.tx_queue.put(ch, commands[payload], mode=mode, burst=burst)
+            elif sub in commands_fmt1:
+                try:
+                    arg = int(payload)
+                except ValueError:
+                    print('Invalid %s value: %s' % (sub, payload))
+                    return
+                if not 0 <= arg <= 255:
+                    # the value is a single frame byte, out of range ones would fail in the TX loop
+                    print('%s value out of range 0..255: %s' % (sub, payload))
+                    return
+                adapter.tx_queue.put(ch, commands_fmt1[sub], mode=mode, burst=burst, fmt=1, d0=arg)
+
+        return handler
+
+    # Every member channel is queued at once and sent in a burst paced by tx_gap, broadcast
+    # requests only address the devices bound to one channel and can't merge channels.
+    def _group_handler(self, name: str, sub: str, payload: str):
+        members = self._groups.get(name)
+        if members is None:
+            print('Unknown group: %s' % name)
+            return
+        for route, ch in members:
+            self._tx_handlers[route](ch, sub, payload, burst=True)
+
+    def _scene_handler(self, name: str, sub: str, _payload: str):
+        commands = self._scenes.get(name)
+        if commands is None or sub is not None:
+            print('Unknown scene: %s' % name)
+            return
+        for route, ch, command_sub, command in commands:
+            self._tx_handlers[route](ch, command_sub, command, burst=True)
+
+    def _bind_handler(self, mode: Mode):
+        def handler(ch: int, sub: str, payload: str):
+            adapter = self._adapter(ch)
+            if adapter is not None and sub is None and payload in BOOLEANS:
+                adapter.tx_queue.put(
+                    ch - adapter.offset,
                     Command.OFF,
-                    mode=Mode.RX_F,
-                    ctr=Request.BIND_START if BOOLEANS[bind_en] else Request.BIND_STOP
+                    mode=mode,
+                    ctr=Request.BIND_START if BOOLEANS[payload] else Request.BIND_STOP,
+                    priority=PRIORITY_AUTOMATION
                 )
-                sleep(0.3)
 
-    # The callback to call when packet received from noolite
-    def _on_packet(self, packet: bytes):
-        mode = packet[1]
-        ch = packet[4]
-        cmd = packet[5]
-        self._mqtt_client.publish(
-            '%s/echo/%d' % (self._mqtt_prefix, ch),
-            '[%s]' % ','.join([str(b) for b in packet])
+        return handler
+
+    # The callback for every frame written to serial
+    def _on_sent(self, adapter: Adapter, request: TxRequest, now: float):
+        adapter.pending.sent(request, now)
+        self._frames_sent.inc((request.mode, request.cmd))
+
+    # The callback for every message written to the broker connection (acknowledged for QoS > 0)
+    def _on_publish(self, _client: mqtt.Client, _user_data, mid: int):
+        self._mqtt_sent.inc()
+        if self._in_flight.pop(mid, None) is None:
+            # QoS 0 messages may be written before publish() returns their mid
+            self._sent_early.add(mid)
+
+    # The callback for the final outcome of a nooLite-F command
+    def _on_tx_result(self, adapter: Adapter, request: TxRequest, result: str, attempts: int, rtt: float):
+        if self._metrics is not None and result != RESULT_TIMEOUT:
+            self._tx_response_time.observe(rtt)
+        if self._poller is not None and request.cmd == Command.READ_STATE:
+            self._poller.on_result(adapter.offset + request.ch, result == Response.SUCCESS.name)
+        self.publish(
+            self.topics.result_f[adapter.offset + request.ch],
+            json.dumps({
+                'command': Command(request.cmd).name,
+                'result': result,
+                'attempts': attempts,
+                'rtt': round(rtt, 3),
+            })
         )
-        if mode == Mode.TX_F:  # nooLite-F state case
-            if cmd == Command.SEND_STATE:  # switch state
-                state = packet[9] & 0x0f
-                brightness = packet[10] & 0xff
-                self._mqtt_client.publish(
-                    '%s/state-f/%d' % (self._mqtt_prefix, ch),
-                    'ON' if state > 0 else 'OFF',
-                    retain=True
-                )
-                self._mqtt_client.publish(
-                    '%s/state-f/%d/brightness' % (self._mqtt_prefix, ch),
-                    str(brightness),
-                    retain=True
-                )
-        elif mode == Mode.RX or mode == Mode.RX_F:  # regular command
-            if cmd == Command.TEMPORARY_ON or cmd == Command.ON or cmd == Command.OFF:  # switch and motion detector
-                switch_topic = '%s/switch/%d' % (self._mqtt_prefix, ch)
-                self._mqtt_client.publish(
-                    switch_topic,
-                    'ON' if cmd != Command.OFF else 'OFF'
-                )
-                # remove any pending postponed message to this switch
-                self._postponed = [
-                    (trigger_time, topic, payload)
-                    for (trigger_time, topic, payload) in self._postponed
-                    if topic != switch_topic
-                ]
-                # set postponed message for motion detector
-                if cmd == Command.TEMPORARY_ON:
-                    interval = packet[7] * 5
-                    self._postponed.append((time() + interval, switch_topic, 'OFF'))
-
-            elif cmd == Command.TOGGLE:  # remote button
-                switch_topic = '%s/button/%d' % (self._mqtt_prefix, ch)
-                self._mqtt_client.publish(
-                    switch_topic,
-                    'TOGGLE'
-                )
-
-            elif cmd == Command.SENSOR_TEMP_HUM:  # temperature & humidity sensor
-                deci_temp = packet[7] | ((packet[8] & 0x0f) << 8)
 
-                # fix for signed 12-bit values
-                if deci_temp & 0x0800:
-                    from ctypes import c_int16
-                    deci_temp = c_int16(deci_temp | 0xf000).value
+    # The callback to call when packet received from noolite
+    def _on_packet(self, adapter: Adapter, packet: bytes):
+        # adapter response lets the next queued command go and resolves the command it answers
+        adapter.on_frame(packet)
 
-                temp = deci_temp / 10.0
-                hum = packet[9]
-                battery = packet[10] / 50.0  # very custom, original PT111 sends 255 value here always
-                self._mqtt_client.publish(
-                    '%s/temperature/%d' % (self._mqtt_prefix, ch),
-                    '%.1f' % temp
-                )
-                self._mqtt_client.publish(
-                    '%s/humidity/%d' % (self._mqtt_prefix, ch),
-                    '%d' % hum
-                )
-                self._mqtt_client.publish(
-                    '%s/battery/%d' % (self._mqtt_prefix, ch),
-                    '%.2f' % battery
-                )
+        if self._metrics is not None:
+            self._frames_received.inc((packet[1], packet[5]))
 
-            elif cmd == Command.BATTERY_LOW:  # low battery
-                self._mqtt_client.publish(
-                    '%s/battery/%d' % (self._mqtt_prefix, ch),
-                    '0'
-                )
+        ch = packet[4]
+        if ch >= CHANNELS:
+            return
+        ch += adapter.offset
+
+        if self._echo is not None:
+            echo = self._echo.message(ch, packet)
+            if echo is not None:
+                self.publish(*echo)
+
+        # announce a newly seen transmitter before its first state
+        if self._discovery is not None and (packet[1] == Mode.RX or packet[1] == Mode.RX_F):
+            for topic, payload in self._discovery.observe(ch, packet[5]) or ():
+                self.publish(topic, payload, retain=True, qos=1)
+
+        decoder = self.decoders.get(packet[1], packet[5])
+        if decoder is not None:
+            decoder(self, ch, packet)
+
+    def publish(self, topic: str, payload: str, retain: bool = False, qos: int = 0):
+        if self._snapshot is not None:
+            self._snapshot.set_value(topic, payload)
+        if not self._connected:
+            self._outbox.put(topic, payload, qos, retain)
+            return
+        if self._send(topic, payload, qos, retain) == mqtt.MQTT_ERR_NO_CONN and qos == 0:
+            # connection is lost but not reported yet, paho keeps and resends only QoS > 0 messages
+            self._outbox.put(topic, payload, qos, retain)
+
+    def publish_state(self, topic: str, payload: str, value=None, deadband: float = 0.0, retain: bool = False):
+        """Publishes a state value, skipping unchanged values when publish-on-change cache is enabled"""
+        if self._aggregator is not None and value is not None:
+            messages = self._aggregator.add(topic, value, payload, time())
+            if messages is not None:
+                for stat_topic, stat_payload in messages:
+                    self.publish(stat_topic, stat_payload)
+                if not self._aggregate_raw:
+                    return
+        if self._publish_cache is not None:
+            if not self._publish_cache.should_publish(topic, payload if value is None else value, deadband):
+                return
+        self.publish(topic, payload, retain=retain)
+
+    def postpone(self, topic: str, delay: float, payload: str):
+        """Publishes payload to topic after delay seconds unless cancelled or postponed again"""
+        self._postponed.schedule(topic, time() + delay, payload)
+        if self._snapshot is not None:
+            self._snapshot.set_timer(topic, delay, payload)
+
+    def cancel_postponed(self, topic: str):
+        if self._postponed.cancel(topic) and self._snapshot is not None:
+            self._snapshot.clear_timer(topic)
+
+
+def device_list(value: str) -> List[str]:
+    return [device for device in value.split(',') if device != '']
 
 
 def cli():
     parser = argparse.ArgumentParser()
 
-    parser.add_argument('serial_device', help='Serial device name', type=str)
+    parser.add_argument('serial_device', help='Serial device name, several adapters may be given comma separated, '
+                                              'each next one serves the next 64 channels',
+                        type=device_list)
     parser.add_argument('mqtt_prefix', help='MQTT prefix', type=str)
     parser.add_argument('mqtt_host', help='MQTT hostname', type=str)
     parser.add_argument('username', help='MQTT user name', type=str, nargs='?', default=None)
     parser.add_argument('password', help='MQTT user password', type=str, nargs='?', default=None)
     parser.add_argument('-p', '--mqtt_port', help='MQTT port', type=int, nargs='?', default=1883)
+    parser.add_argument('--tx-interval', help='Minimal interval between serial commands, seconds',
+                        type=float, default=0.3)
+    parser.add_argument('--tx-queue-size', help='Maximal number of commands waiting to be sent',
+                        type=int, default=64)
+    parser.add_argument('--tx-pacing', help='fixed waits --tx-interval after every command, '
+                                            'response sends the next command as soon as the adapter answers',
+                        choices=[PACING_FIXED, PACING_RESPONSE], default=PACING_FIXED)
+    parser.add_argument('--tx-response-timeout', help='Maximal wait for the adapter response, seconds',
+                        type=float, default=0.5)
+    parser.add_argument('--tx-gap', help='Minimal interval after a nooLite (non-F) command with response pacing, '
+                                         'seconds',
+                        type=float, default=0.1)
+    parser.add_argument('--tx-rate', help='Long term limit of commands per second for every adapter, '
+                                          'background commands leave half of --tx-burst to user commands',
+                        type=float, default=None)
+    parser.add_argument('--tx-burst', help='Number of commands which may be sent at once within --tx-rate',
+                        type=float, default=5.0)
+    parser.add_argument('--tx-f-attempts', help='Maximal number of attempts for nooLite-F commands '
+                                                'which got no response',
+                        type=int, default=3)
+    parser.add_argument('--tx-f-timeout', help='Time to wait for nooLite-F command result, seconds',
+                        type=float, default=1.0)
+    parser.add_argument('--tx-f-backoff', help='Delay before the first retry of nooLite-F command, doubled '
+                                               'for every next one, seconds',
+                        type=float, default=0.5)
+    parser.add_argument('--echo', help='Echo received frames as text, raw binary or not at all',
+                        choices=[ECHO_TEXT, ECHO_BINARY, ECHO_OFF], default=ECHO_TEXT)
+    parser.add_argument('--echo-sample', help='Echo only every N-th received frame', type=int, default=1)
+    parser.add_argument('--echo-filter', help='Echo only frames with MODE[:COMMAND] given by names or numbers, '
+                                              'e.g. RX:TOGGLE or 2, may be repeated',
+                        type=parse_echo_filter, action='append', default=None)
+    parser.add_argument('--echo-aggregate', help='Echo all frames to <prefix>/echo instead of per channel topics',
+                        action='store_true')
+    parser.add_argument('--publish-on-change', help='Publish nooLite-F state and sensor values only when changed',
+                        action='store_true')
+    parser.add_argument('--publish-max-interval', help='Publish unchanged values at least this often, seconds',
+                        type=float, default=300.0)
+    parser.add_argument('--temperature-deadband', help='Temperature change treated as no change, °C',
+                        type=float, default=0.0)
+    parser.add_argument('--humidity-deadband', help='Humidity change treated as no change, %%',
+                        type=float, default=0.0)
+    parser.add_argument('--battery-deadband', help='Battery voltage change treated as no change, V',
+                        type=float, default=0.0)
+    parser.add_argument('--decoders', help='Python module with register_decoders(registry) function adding '
+                                           'custom packet decoders, may be repeated',
+                        action='append', default=[])
+    parser.add_argument('--engine', help='Main loop engine: select waits on serial and MQTT sockets, '
+                                         'poll is the legacy polling loop, asyncio runs on an asyncio event loop',
+                        choices=['select', 'poll', 'asyncio'], default='select')
+    parser.add_argument('--metrics-port', help='Serve Prometheus metrics over HTTP on this port, disabled by default',
+                        type=int, default=None)
+    parser.add_argument('--auto-discovery', help='Publish Home Assistant discovery for transmitters '
+                                                 'the first time their frames are received',
+                        action='store_true')
+    parser.add_argument('--auto-discovery-state', help='File keeping the channels already announced by '
+                                                       '--auto-discovery across restarts',
+                        type=str, default=None)
+    parser.add_argument('--outbox-size', help='Maximal number of messages kept while the broker is unavailable',
+                        type=int, default=1000)
+    parser.add_argument('--outbox-policy', help='oldest drops the oldest message when the outbox is full, '
+                                                'coalesce also keeps only the latest message of every topic',
+                        choices=[DROP_OLDEST, DROP_COALESCE], default=DROP_OLDEST)
+    parser.add_argument('--reconnect-min-delay', help='Delay before the first reconnect to the broker, doubled '
+                                                      'after every failed attempt, seconds',
+                        type=float, default=1.0)
+    parser.add_argument('--reconnect-max-delay', help='Maximal delay between reconnect attempts, seconds',
+                        type=float, default=60.0)
+    parser.add_argument('--snapshot', help='File keeping last known states and postponed messages across restarts',
+                        type=str, default=None)
+    parser.add_argument('--snapshot-interval', help='Maximal delay of state changes written to the snapshot, seconds',
+                        type=float, default=1.0)
+    parser.add_argument('--poll-channels', help='nooLite-F channels to refresh state of in background, '
+                                                'comma separated channels and ranges, e.g. 0,3,10-15',
+                        type=channel_ranges, default=None)
+    parser.add_argument('--poll-period', help='Time to refresh state of all --poll-channels in, seconds',
+                        type=float, default=300.0)
+    parser.add_argument('--groups', help='JSON file with groups and scenes of channels controlled by '
+                                         '<prefix>/group/<name> and <prefix>/scene/<name> topics',
+                        type=str, default=None)
+    parser.add_argument('--aggregate-seconds', help='Publish min/max/mean/last of sensor values to '
+                                                    '<topic>/<stat> for windows of this duration, seconds',
+                        type=float, default=None)
+    parser.add_argument('--aggregate-samples', help='Close sensor aggregation windows after this number of values',
+                        type=int, default=None)
+    parser.add_argument('--aggregate-channels', help='Channels to aggregate sensor values of, e.g. 0,3,10-15, '
+                                                     'all by default',
+                        type=channel_ranges, default=None)
+    parser.add_argument('--aggregate-no-raw', help='Don\'t publish raw values of aggregated sensor topics',
+                        dest='aggregate_raw', action='store_false')
+    parser.add_argument('--metrics-host', help='Address to serve metrics on', type=str, default='127.0.0.1')
 
     args = vars(parser.parse_args())
+    decoder_modules = args.pop('decoders')
+
+    if args['engine'] == 'asyncio':
+        from .aio import AsyncNooLiteMQTT
+        bridge = AsyncNooLiteMQTT(**args)
+    else:
+        bridge = NooLiteMQTT(**args)
+
+    for module_name in decoder_modules:
+        importlib.import_module(module_name).register_decoders(bridge.decoders)
 
-    NooLiteMQTT(**args).loop()
+    bridge.loop()
 
 
 if __name__ == '__main__':
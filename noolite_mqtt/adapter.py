@@ -0,0 +1,67 @@
+from time import monotonic as time
+from typing import Callable, Dict, List, Optional
+
+from .decoders import CHANNELS
+from .noolite_serial import NooLiteSerial
+from .pending import PendingRequests
+from .tx_queue import TxQueue, TxRequest
+
+
+class Adapter:
+    """
+    One MTRF64 adapter driven by the bridge.
+
+    Every adapter has its own serial reader, TX queue and nooLite-F request tracking, so
+    pacing on one radio never delays commands to another. Adapter channels are shown to
+    MQTT shifted by `offset`, e.g. channel 5 of the second adapter is channel 69.
+    `on_result(adapter, request, result, attempts, rtt)` gets nooLite-F command outcomes.
+    """
+
+    def __init__(self, index: int, serial: NooLiteSerial,
+                 on_result: Callable[['Adapter', TxRequest, str, int, float], None],
+                 tx_options: Dict = None, tx_f_options: Dict = None):
+        self.index = index
+        self.offset = index * CHANNELS
+        self.serial = serial
+        self.tx_queue = TxQueue(serial, **(tx_options or {}))
+        self.pending = PendingRequests(
+            self.tx_queue, lambda request, *outcome: on_result(self, request, *outcome), **(tx_f_options or {})
+        )
+        self.tx_queue.on_sent = self.pending.sent
+        self.tx_queue.on_dropped = self.pending.dropped
+
+    @property
+    def name(self) -> str:
+        return self.serial.tty.name
+
+    def fileno(self):
+        return self.serial.fileno()
+
+    def receive(self) -> List[bytes]:
+        return self.serial.receive()
+
+    def on_frame(self, frame: bytes, now: float = None):
+        """Passes a received frame to the TX queue pacing and nooLite-F request tracking"""
+        if now is None:
+            now = time()
+        self.tx_queue.on_frame(frame, now)
+        self.pending.on_frame(frame, now)
+
+    def process(self, now: float):
+        # response timeouts and retries of nooLite-F commands
+        self.pending.process(now)
+        # write queued commands to serial
+        self.tx_queue.process(now)
+
+    def next_deadline(self) -> Optional[float]:
+        deadlines = [
+            deadline
+            for deadline in (self.tx_queue.next_deadline(), self.pending.next_deadline())
+            if deadline is not None
+        ]
+        return min(deadlines) if deadlines else None
+
+    def print_stats(self):
+        print('TX queue stats (%s): %s' % (self.name, self.tx_queue.stats()))
+        print('TX-F requests stats (%s): %s' % (self.name, self.pending.stats()))
+        print('Serial stats (%s): %s' % (self.name, self.serial.stats()))
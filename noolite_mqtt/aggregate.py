@@ -0,0 +1,108 @@
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .timers import TimerQueue
+
+STATS = ('min', 'max', 'mean', 'last')
+
+# offsets of the running window values in a slot
+_COUNT, _SUM, _MIN, _MAX, _LAST = range(5)
+_SLOT = 5
+
+
+class WindowAggregator:
+    """
+    Tumbling windows of sensor values published as `<topic>/min`, `/max`, `/mean` and `/last`.
+
+    A window opens with the first value of a topic and closes after `seconds` or `samples`
+    values, whichever comes first. Windows only keep running count, sum, min, max and last
+    value, all topics share one flat array of doubles, so memory doesn't depend on the
+    sensor rate or window length.
+    """
+
+    def __init__(self, topics: Iterable[str], seconds: float = None, samples: int = None):
+        if seconds is None and samples is None:
+            raise ValueError('Aggregation window needs a duration or a number of samples')
+
+        self._seconds = seconds
+        self._samples = samples
+        self._slots = {}
+        self._stat_topics = []
+        for topic in topics:
+            self._slots[topic] = len(self._stat_topics)
+            self._stat_topics.append(['%s/%s' % (topic, stat) for stat in STATS])
+        self._values = array('d', bytes(8 * _SLOT * len(self._stat_topics)))
+        # number of decimals of the raw payload, reused for min, max and last
+        self._decimals = [0] * len(self._stat_topics)
+        self._closing = TimerQueue()
+
+        self.samples = 0
+        self.windows = 0
+
+    def __contains__(self, topic: str):
+        return topic in self._slots
+
+    def add(self, topic: str, value: float, payload: str, now: float) -> Optional[List[Tuple[str, str]]]:
+        """
+        Adds a value to the window of topic, returns None for topics without a window,
+        the (topic, payload) stats of the window if the value completed it, [] otherwise
+        """
+        slot = self._slots.get(topic)
+        if slot is None:
+            return None
+
+        self.samples += 1
+        values = self._values
+        base = slot * _SLOT
+        if values[base + _COUNT] == 0:
+            values[base + _SUM] = values[base + _MIN] = values[base + _MAX] = value
+            if self._seconds is not None:
+                self._closing.schedule(slot, now + self._seconds)
+        else:
+            values[base + _SUM] += value
+            if value < values[base + _MIN]:
+                values[base + _MIN] = value
+            if value > values[base + _MAX]:
+                values[base + _MAX] = value
+        values[base + _COUNT] += 1
+        values[base + _LAST] = value
+        _, dot, decimals = payload.partition('.')
+        self._decimals[slot] = len(decimals) if dot else 0
+
+        if self._samples is not None and values[base + _COUNT] >= self._samples:
+            self._closing.cancel(slot)
+            return self._close(slot)
+        return []
+
+    def next_deadline(self) -> Optional[float]:
+        return self._closing.next_deadline()
+
+    def process(self, now: float) -> List[Tuple[str, str]]:
+        """Closes windows which are due, returns their (topic, payload) stats"""
+        messages = []
+        for slot, _ in self._closing.pop_expired(now):
+            messages += self._close(slot)
+        return messages
+
+    def stats(self) -> Dict:
+        return {
+            'topics': len(self._slots),
+            'samples': self.samples,
+            'windows': self.windows,
+        }
+
+    def _close(self, slot: int) -> List[Tuple[str, str]]:
+        values = self._values
+        base = slot * _SLOT
+        count = values[base + _COUNT]
+        values[base + _COUNT] = 0
+        self.windows += 1
+
+        decimals = self._decimals[slot]
+        stat_values = (values[base + _MIN], values[base + _MAX], values[base + _SUM] / count, values[base + _LAST])
+        # the mean gets one decimal more than the raw values
+        stat_decimals = (decimals, decimals, decimals + 1, decimals)
+        return [
+            (topic, '%.*f' % (places, value))
+            for topic, value, places in zip(self._stat_topics[slot], stat_values, stat_decimals)
+        ]
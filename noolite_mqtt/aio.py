@@ -0,0 +1,181 @@
+import asyncio
+import signal
+from time import monotonic as time, process_time
+
+import paho.mqtt.client as mqtt
+
+from . import NooLiteMQTT
+from .adapter import Adapter
+from .noolite_serial import NooLiteSerial
+
+
+class AsyncNooLiteSerial(NooLiteSerial):
+    """
+    NooLiteSerial which reads frames from an event loop reader on the tty fd.
+
+    Frames are collected in a queue as soon as the port becomes readable and
+    are consumed with `await read_packet()`.
+    """
+
+    def __init__(self, tty_name):
+        super().__init__(tty_name)
+        self._loop = None
+        self._packets = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        if self.fileno() is None:
+            raise ValueError('Serial port %s can not be used with asyncio' % self.tty.name)
+        self._loop = loop
+        self._packets = asyncio.Queue()
+        loop.add_reader(self.fileno(), self._on_readable)
+
+    def detach(self):
+        if self._loop is not None:
+            self._loop.remove_reader(self.fileno())
+            self._loop = None
+
+    async def read_packet(self):
+        return await self._packets.get()
+
+    def _on_readable(self):
+        for packet in self.receive():
+            self._packets.put_nowait(packet)
+
+
+class AsyncNooLiteMQTT(NooLiteMQTT):
+    """
+    NooLiteMQTT running on an asyncio event loop.
+
+    MQTT socket I/O is driven by loop readers/writers through paho socket callbacks,
+    TX pacing and postponed messages are handled by a timer coroutine, so `run()`
+    can be awaited next to other tasks of a host application.
+    """
+    serial_class = AsyncNooLiteSerial
+    engines = ('asyncio',)
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('engine', 'asyncio')
+        super().__init__(*args, **kwargs)
+        self._loop = None
+        self._wake = None
+        self._stopped = None
+
+    def loop(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.add_signal_handler(signal.SIGINT, self._interrupt_handler)
+        loop.add_signal_handler(signal.SIGTERM, self._interrupt_handler)
+        try:
+            loop.run_until_complete(self.run())
+        finally:
+            loop.close()
+
+    async def run(self):
+        self._loop = asyncio.get_event_loop()
+        self._wake = asyncio.Event()
+        self._stopped = asyncio.Event()
+        if self._exit:
+            self._stopped.set()
+
+        client = self._mqtt_client
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+        # socket was opened by connect() before the callbacks were set
+        if client.socket() is not None:
+            self._on_socket_open(client, None, client.socket())
+            if client.want_write():
+                self._on_socket_register_write(client, None, client.socket())
+
+        for adapter in self._adapters:
+            adapter.serial.attach(self._loop)
+
+        self.publish('%s/LWT' % self._mqtt_prefix, 'Online', retain=True)
+
+        started_at = time()
+        cpu_started_at = process_time()
+
+        tasks = [self._loop.create_task(self._serial_task(adapter)) for adapter in self._adapters] + [
+            self._loop.create_task(self._timers_task()),
+            self._loop.create_task(self._misc_task()),
+        ]
+        try:
+            await self._stopped.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for adapter in self._adapters:
+                adapter.serial.detach()
+            if client.socket() is not None:
+                self._on_socket_close(client, None, client.socket())
+
+        if self._snapshot is not None:
+            self._snapshot.close()
+
+        self._print_stats(time() - started_at, process_time() - cpu_started_at)
+
+    def stop(self):
+        super().stop()
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def _serial_task(self, adapter: Adapter):
+        while True:
+            packet = await adapter.serial.read_packet()
+            self._loop_iterations += 1
+            started_at = time()
+            self._on_packet(adapter, packet)
+            if self._metrics is not None:
+                self._loop_time.observe(time() - started_at)
+            # packet may have scheduled a postponed message
+            self._wake.set()
+
+    async def _timers_task(self):
+        while True:
+            self._loop_iterations += 1
+            started_at = time()
+            self._process_timers()
+            if self._metrics is not None:
+                self._loop_time.observe(time() - started_at)
+            self._wake.clear()
+            deadline = self._next_deadline()
+            try:
+                await asyncio.wait_for(self._wake.wait(), None if deadline is None else max(0.0, deadline - time()))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _misc_task(self):
+        # MQTT keepalive and retries
+        while True:
+            self._mqtt_client.loop_misc()
+            await asyncio.sleep(1.0)
+
+    def _schedule_reconnect(self, now: float):
+        super()._schedule_reconnect(now)
+        # disconnects raised by loop_misc() or the writer don't go through the timers task
+        if self._wake is not None:
+            self._wake.set()
+
+    def _probe_done(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _on_socket_open(self, _client: mqtt.Client, _user_data, sock):
+        self._loop.add_reader(sock, self._on_socket_readable)
+
+    def _on_socket_close(self, _client: mqtt.Client, _user_data, sock):
+        self._loop.remove_reader(sock)
+        self._loop.remove_writer(sock)
+
+    def _on_socket_register_write(self, _client: mqtt.Client, _user_data, sock):
+        self._loop.add_writer(sock, self._mqtt_client.loop_write)
+
+    def _on_socket_unregister_write(self, _client: mqtt.Client, _user_data, sock):
+        self._loop.remove_writer(sock)
+
+    def _on_socket_readable(self):
+        self._mqtt_client.loop_read()
+        # received commands are waiting in the TX queue
+        self._wake.set()
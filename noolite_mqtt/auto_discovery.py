@@ -0,0 +1,78 @@
+import json
+import os
+from typing import List, Optional, Tuple
+
+from .enums import Command
+from .hass_discover import AUTO_DISCOVERED, DiscoveryCollector, device_push, push_noolite_root_device
+
+# device type and push_* options for the commands sent by nooLite transmitters
+OBSERVED_DEVICES = {
+    Command.SENSOR_TEMP_HUM: ('pt111', {}),
+    Command.TEMPORARY_ON: ('pm112', {}),
+    Command.TOGGLE: ('pxx', {'mode': 'button'}),
+}
+
+ROOT = 'root'
+
+
+class AutoDiscovery:
+    """
+    Home Assistant discovery of transmitters inferred from received frames.
+
+    The first frame of a known command on a channel yields the discovery configs of
+    the device type it stands for. Announced (channel, type) pairs are kept in
+    `state_file`, so a restart does not publish them again. Device configs are marked with
+    AUTO_DISCOVERED sw_version, so noolite-mqtt-ha-discover doesn't clear them.
+    """
+
+    def __init__(self, mqtt_prefix: str, root_id: str = None, state_file: str = None):
+        self._mqtt_prefix = mqtt_prefix
+        self._root_id = root_id or mqtt_prefix.replace('/', '_')
+        self._state_file = state_file
+        self._announced = set()
+        # (channel, command) pairs already handled, the only lookup for most frames
+        self._seen = set()
+
+        if state_file is not None and os.path.exists(state_file):
+            with open(state_file) as f:
+                self._announced = set(ROOT if entry == ROOT else tuple(entry) for entry in json.load(f))
+
+    def __len__(self):
+        return len(self._announced - {ROOT})
+
+    def observe(self, ch: int, cmd: int) -> Optional[List[Tuple[str, str]]]:
+        """Returns discovery (topic, payload) messages when the frame reveals a new device, None otherwise"""
+        key = (ch, cmd)
+        if key in self._seen:
+            return None
+        self._seen.add(key)
+
+        if cmd not in OBSERVED_DEVICES:
+            return None
+        device_type, options = OBSERVED_DEVICES[cmd]
+        if (ch, device_type) in self._announced:
+            return None
+
+        collector = DiscoveryCollector()
+        if ROOT not in self._announced:
+            push_noolite_root_device(collector, self._mqtt_prefix, self._root_id)
+            self._announced.add(ROOT)
+        device_collector = DiscoveryCollector()
+        device_push[device_type](device_collector, self._mqtt_prefix, self._root_id, ch, **options)
+        for topic, payload in device_collector.configs.items():
+            config = json.loads(payload)
+            config['device']['sw_version'] = AUTO_DISCOVERED
+            collector.configs[topic] = json.dumps(config)
+        self._announced.add((ch, device_type))
+        self._save()
+
+        print('Discovered %s on channel %d' % (device_type, ch))
+        return sorted(collector.configs.items())
+
+    def _save(self):
+        if self._state_file is None:
+            return
+        tmp_file = self._state_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(sorted(self._announced, key=str), f)
+        os.replace(tmp_file, self._state_file)
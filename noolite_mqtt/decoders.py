@@ -0,0 +1,102 @@
+from typing import Callable, Optional
+
+from .enums import Command, Mode
+
+CHANNELS = 64
+
+
+class Topics:
+    """Per channel topic strings, built once for the bridge prefix"""
+
+    def __init__(self, prefix: str, channels: int = CHANNELS):
+        self.channels = channels
+        self.echo = self._build(prefix, 'echo/%d', channels)
+        self.state_f = self._build(prefix, 'state-f/%d', channels)
+        self.brightness_f = self._build(prefix, 'state-f/%d/brightness', channels)
+        self.result_f = self._build(prefix, 'result-f/%d', channels)
+        self.switch = self._build(prefix, 'switch/%d', channels)
+        self.button = self._build(prefix, 'button/%d', channels)
+        self.temperature = self._build(prefix, 'temperature/%d', channels)
+        self.humidity = self._build(prefix, 'humidity/%d', channels)
+        self.battery = self._build(prefix, 'battery/%d', channels)
+
+    def __len__(self):
+        return self.channels
+
+    @staticmethod
+    def _build(prefix: str, pattern: str, channels: int):
+        return [('%s/' + pattern) % (prefix, ch) for ch in range(channels)]
+
+
+# decoder(bridge, channel, packet), bridge provides topics, publish(), publish_state(),
+# postpone() and cancel_postponed()
+Decoder = Callable[[object, int, bytes], None]
+
+
+class DecoderRegistry:
+    """Packet decoders keyed by (mode, command) of the received frame"""
+
+    def __init__(self):
+        self._decoders = {}
+
+    def register(self, mode: Mode, cmd: Command, decoder: Decoder):
+        self._decoders[(mode, cmd)] = decoder
+
+    def register_rx(self, cmd: Command, decoder: Decoder):
+        """Registers decoder for both nooLite and nooLite-F receive modes"""
+        self.register(Mode.RX, cmd, decoder)
+        self.register(Mode.RX_F, cmd, decoder)
+
+    def get(self, mode: int, cmd: int) -> Optional[Decoder]:
+        return self._decoders.get((mode, cmd))
+
+
+def decode_send_state(bridge, ch: int, packet: bytes):  # nooLite-F switch state
+    state = packet[9] & 0x0f
+    brightness = packet[10] & 0xff
+    bridge.publish_state(bridge.topics.state_f[ch], 'ON' if state > 0 else 'OFF', retain=True)
+    bridge.publish_state(bridge.topics.brightness_f[ch], str(brightness), retain=True)
+
+
+def decode_switch(bridge, ch: int, packet: bytes):  # switch and motion detector
+    cmd = packet[5]
+    switch_topic = bridge.topics.switch[ch]
+    bridge.publish(switch_topic, 'ON' if cmd != Command.OFF else 'OFF')
+    # remove any pending postponed message to this switch
+    bridge.cancel_postponed(switch_topic)
+    # set postponed message for motion detector
+    if cmd == Command.TEMPORARY_ON:
+        bridge.postpone(switch_topic, packet[7] * 5, 'OFF')
+
+
+def decode_button(bridge, ch: int, _packet: bytes):  # remote button
+    bridge.publish(bridge.topics.button[ch], 'TOGGLE')
+
+
+def decode_temp_hum(bridge, ch: int, packet: bytes):  # temperature & humidity sensor
+    deci_temp = packet[7] | ((packet[8] & 0x0f) << 8)
+    # signed 12-bit value
+    if deci_temp & 0x0800:
+        deci_temp -= 0x1000
+
+    temp = deci_temp / 10.0
+    hum = packet[9]
+    battery = packet[10] / 50.0  # very custom, original PT111 sends 255 value here always
+    bridge.publish_state(bridge.topics.temperature[ch], '%.1f' % temp, temp, bridge.temperature_deadband)
+    bridge.publish_state(bridge.topics.humidity[ch], '%d' % hum, hum, bridge.humidity_deadband)
+    bridge.publish_state(bridge.topics.battery[ch], '%.2f' % battery, battery, bridge.battery_deadband)
+
+
+def decode_battery_low(bridge, ch: int, _packet: bytes):  # low battery
+    bridge.publish_state(bridge.topics.battery[ch], '0', 0.0)
+
+
+def default_decoders() -> DecoderRegistry:
+    registry = DecoderRegistry()
+    registry.register(Mode.TX_F, Command.SEND_STATE, decode_send_state)
+    for cmd in (Command.TEMPORARY_ON, Command.ON, Command.OFF):
+        registry.register_rx(cmd, decode_switch)
+    registry.register_rx(Command.TOGGLE, decode_button)
+    registry.register_rx(Command.SENSOR_TEMP_HUM, decode_temp_hum)
+    registry.register_rx(Command.BATTERY_LOW, decode_battery_low)
+    return registry
@@ -0,0 +1,57 @@
+from typing import Iterable, Optional, Tuple
+
+from .enums import Command, Mode
+
+ECHO_OFF = 'off'
+ECHO_TEXT = 'text'
+ECHO_BINARY = 'binary'
+
+
+def parse_echo_filter(value: str) -> Tuple[int, Optional[int]]:
+    """Parses MODE[:COMMAND] given by names or numbers, e.g. RX:SENSOR_TEMP_HUM, TX_F or 1:21"""
+    mode, _, cmd = value.partition(':')
+    try:
+        return (
+            int(mode) if mode.isdecimal() else Mode[mode.upper()],
+            None if cmd in ('', '*') else int(cmd) if cmd.isdecimal() else Command[cmd.upper()],
+        )
+    except KeyError as e:
+        raise ValueError('Unknown mode or command %s' % e)
+
+
+class Echo:
+    """
+    Builds echo messages for received frames.
+
+    Frames are published as `[173,1,...]` text or raw 17 bytes, either per channel
+    to `<prefix>/echo/<ch>` or all to `<prefix>/echo`. Only every `sample`-th frame
+    passing `filters` ((mode, command) pairs, None command matches any) is echoed.
+    """
+
+    def __init__(self, prefix: str, channel_topics, payload: str = ECHO_TEXT, sample: int = 1,
+                 filters: Iterable[Tuple[int, Optional[int]]] = None, aggregate: bool = False):
+        if payload not in (ECHO_TEXT, ECHO_BINARY):
+            raise ValueError('Unknown echo payload: %s' % payload)
+
+        self._binary = payload == ECHO_BINARY
+        self._sample = max(1, sample)
+        self._filters = frozenset(filters) if filters else None
+        self._topic = '%s/echo' % prefix if aggregate else None
+        self._channel_topics = channel_topics
+        self._seen = 0
+
+    def message(self, ch: int, packet: bytes):
+        """Returns (topic, payload) to publish or None if the frame is not echoed"""
+        if self._filters is not None:
+            mode = packet[1]
+            if (mode, packet[5]) not in self._filters and (mode, None) not in self._filters:
+                return None
+
+        self._seen += 1
+        if self._sample > 1 and self._seen % self._sample != 1:
+            return None
+
+        return (
+            self._topic or self._channel_topics[ch],
+            bytes(packet) if self._binary else '[%s]' % ','.join([str(b) for b in packet]),
+        )
@@ -0,0 +1,198 @@
+import argparse
+import heapq
+import os
+import pty
+import random
+import select
+import threading
+import tty
+from itertools import count
+from time import monotonic as time
+from typing import List
+
+from .enums import Command, Mode, Request, Response
+from .noolite_serial import RX_START, RX_STOP, TX_START, TX_STOP, FrameParser
+
+
+def rx_frame(mode: int, ch: int, cmd: int, ctr: int = 0, fmt: int = 0,
+             d0: int = 0, d1: int = 0, d2: int = 0, d3: int = 0, togl: int = 0) -> bytes:
+    """Builds a frame as sent by the adapter"""
+    body = [RX_START, mode, ctr, togl, ch, cmd, fmt, d0, d1, d2, d3, 0, 0, 0, 0]
+    return bytes(body + [sum(body) & 0xff, RX_STOP])
+
+
+class DeviceState:
+    def __init__(self):
+        self.on = False
+        self.brightness = 255
+
+
+class MTRF64Emulator:
+    """
+    Virtual MTRF64 adapter on a pseudo-terminal.
+
+    `device` is the tty path to give to NooLiteSerial. Command frames are answered after
+    `ack_delay` seconds; nooLite-F commands get NO_RESPONSE with `loss` probability and
+    otherwise change the emulated device state, which READ_STATE reports with SEND_STATE.
+    Synthetic sensor traffic is generated with the given rates (frames per second):
+    PT111 temperature/humidity, PM112 motion (TEMPORARY_ON) and PX button (TOGGLE).
+    With `record` every received command is kept in `commands` as (time, frame).
+    """
+
+    def __init__(self, ack_delay: float = 0.05, loss: float = 0.0,
+                 temp_hum_rate: float = 0.0, motion_rate: float = 0.0, button_rate: float = 0.0,
+                 temp_hum_channels: List[int] = None, motion_channels: List[int] = None,
+                 button_channels: List[int] = None, seed: int = None, record: bool = False):
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.device = os.ttyname(self._slave)
+
+        self._ack_delay = ack_delay
+        self._loss = loss
+        self._random = random.Random(seed)
+        self._parser = FrameParser(TX_START, TX_STOP)
+        self._outgoing = []
+        self._seq = count()
+        self._sources = []
+        self._exit = False
+        self._thread = None
+
+        self.devices = {}
+        self.commands = [] if record else None
+        self.received = 0
+        self.sent = 0
+
+        for rate, channels, make in (
+                (temp_hum_rate, temp_hum_channels, self._temp_hum_frame),
+                (motion_rate, motion_channels, self._motion_frame),
+                (button_rate, button_channels, self._button_frame),
+        ):
+            if rate > 0:
+                self._sources.append([time() + self._random.expovariate(rate), rate, channels or [0], make])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='mtrf64-emulator', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._exit = True
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def run(self):
+        while not self._exit:
+            now = time()
+            deadlines = [source[0] for source in self._sources]
+            if self._outgoing:
+                deadlines.append(self._outgoing[0][0])
+            timeout = max(0.0, min(deadlines + [now + 0.1]) - now)
+
+            readable, _, _ = select.select([self._master], [], [], timeout)
+            if readable:
+                for frame in self._parser.feed(os.read(self._master, 1024)):
+                    self.received += 1
+                    if self.commands is not None:
+                        self.commands.append((time(), frame))
+                    self._on_command(frame)
+
+            now = time()
+            for source in self._sources:
+                while source[0] <= now:
+                    self._write(source[3](self._random.choice(source[2])))
+                    source[0] += self._random.expovariate(source[1])
+
+            while self._outgoing and self._outgoing[0][0] <= now:
+                self._write(heapq.heappop(self._outgoing)[2])
+
+    def schedule(self, frame: bytes, delay: float = 0.0):
+        """Sends frame to the serial side after delay"""
+        heapq.heappush(self._outgoing, (time() + delay, next(self._seq), frame))
+
+    def _write(self, frame: bytes):
+        os.write(self._master, frame)
+        self.sent += 1
+
+    def _on_command(self, frame: bytes):
+        mode, ctr, ch, cmd, fmt, d0 = frame[1], frame[2], frame[4], frame[5], frame[6], frame[7]
+
+        if mode != Mode.TX_F or ctr not in (Request.CMD, Request.BROADCAST_CMD):
+            self.schedule(rx_frame(mode, ch, cmd, Response.SUCCESS, fmt, d0), self._ack_delay)
+            return
+
+        if self._random.random() < self._loss:
+            self.schedule(rx_frame(mode, ch, cmd, Response.NO_RESPONSE), self._ack_delay)
+            return
+
+        device = self.devices.setdefault(ch, DeviceState())
+        if cmd == Command.ON:
+            device.on = True
+        elif cmd == Command.OFF:
+            device.on = False
+        elif cmd == Command.TOGGLE:
+            device.on = not device.on
+        elif cmd == Command.BRIGHT_SET:
+            device.brightness = d0
+            device.on = d0 > 0
+
+        if cmd == Command.READ_STATE:
+            self.schedule(
+                rx_frame(mode, ch, Command.SEND_STATE, Response.SUCCESS, d2=int(device.on), d3=device.brightness),
+                self._ack_delay
+            )
+        else:
+            self.schedule(rx_frame(mode, ch, cmd, Response.SUCCESS, fmt, d0), self._ack_delay)
+
+    def _temp_hum_frame(self, ch: int) -> bytes:
+        deci_temp = int(self._random.gauss(215, 30)) & 0x0fff
+        return rx_frame(
+            Mode.RX, ch, Command.SENSOR_TEMP_HUM, fmt=7,
+            d0=deci_temp & 0xff, d1=0x20 | (deci_temp >> 8), d2=self._random.randrange(30, 70), d3=255
+        )
+
+    @staticmethod
+    def _motion_frame(ch: int) -> bytes:
+        # d0 is the ON interval in 5 second units
+        return rx_frame(Mode.RX, ch, Command.TEMPORARY_ON, fmt=5, d0=6)
+
+    @staticmethod
+    def _button_frame(ch: int) -> bytes:
+        return rx_frame(Mode.RX, ch, Command.TOGGLE)
+
+
+def channel_list(value: str) -> List[int]:
+    return [int(ch) for ch in value.split(',') if ch != '']
+
+
+def cli():
+    parser = argparse.ArgumentParser(description='Virtual MTRF64 adapter on a pseudo-terminal')
+
+    parser.add_argument('--ack-delay', help='Delay of adapter responses, seconds', type=float, default=0.05)
+    parser.add_argument('--loss', help='Probability of NO_RESPONSE for nooLite-F commands', type=float, default=0.0)
+    parser.add_argument('--temp-hum-rate', help='PT111 frames per second', type=float, default=0.0)
+    parser.add_argument('--motion-rate', help='PM112 frames per second', type=float, default=0.0)
+    parser.add_argument('--button-rate', help='PX button frames per second', type=float, default=0.0)
+    parser.add_argument('--temp-hum-channels', help='Comma separated PT111 channels', type=channel_list, default=None)
+    parser.add_argument('--motion-channels', help='Comma separated PM112 channels', type=channel_list, default=None)
+    parser.add_argument('--button-channels', help='Comma separated PX channels', type=channel_list, default=None)
+    parser.add_argument('--seed', help='Random seed', type=int, default=None)
+
+    args = vars(parser.parse_args())
+
+    emulator = MTRF64Emulator(**args)
+    print('MTRF64 emulator is listening on %s' % emulator.device)
+    try:
+        emulator.run()
+    except KeyboardInterrupt:
+        print('Exiting emulator...')
+    print('Frames received: %d, sent: %d' % (emulator.received, emulator.sent))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,43 @@
+import json
+from typing import Dict, List, Optional, Tuple
+
+# command routes which group and scene members may refer to
+MEMBER_ROUTES = ('tx', 'tx-f')
+
+
+def parse_target(target: str) -> Tuple[str, int, Optional[str]]:
+    """Parses a member given as a command topic without prefix, e.g. tx-f/4 or tx/1/BRIGHTNESS"""
+    parts = target.split('/')
+    if len(parts) not in (2, 3) or parts[0] not in MEMBER_ROUTES or not parts[1].isdecimal():
+        raise ValueError('Invalid group member: %s' % target)
+    return parts[0], int(parts[1]), parts[2] if len(parts) == 3 else None
+
+
+def load_groups(path: str) -> Tuple[Dict[str, List[Tuple[str, int]]],
+                                    Dict[str, List[Tuple[str, int, Optional[str], str]]]]:
+    """
+    Reads groups and scenes from a JSON file like
+
+        {"groups": {"hall": ["tx/1", "tx-f/4"]},
+         "scenes": {"evening": {"tx/1": "OFF", "tx-f/4/BRIGHTNESS": "40"}}}
+
+    Returns groups as {name: [(route, channel)]} and scenes as {name: [(route, channel, subcommand, payload)]}.
+    """
+    with open(path) as f:
+        config = json.load(f)
+
+    groups = {}
+    for name, targets in config.get('groups', {}).items():
+        members = []
+        for target in targets:
+            route, ch, sub = parse_target(target)
+            if sub is not None:
+                raise ValueError('Group member should be a channel: %s' % target)
+            members.append((route, ch))
+        groups[name] = members
+
+    scenes = {}
+    for name, commands in config.get('scenes', {}).items():
+        scenes[name] = [parse_target(target) + (str(payload),) for target, payload in sorted(commands.items())]
+
+    return groups, scenes
@@ -1,18 +1,22 @@
 import argparse
 import json
-from typing import Dict, List
+from collections import deque
+from time import monotonic as time
+from typing import Dict, List, Tuple
 
 import paho.mqtt.client as mqtt
 
 DISCOVERY_PREFIX = 'homeassistant'
 
+# device sw_version of configs published by the bridge --auto-discovery, never cleared by this tool
+AUTO_DISCOVERED = 'auto-discovered'
+
 
 def discovery_topic(entity_type: str, entity_id: str) -> str:
     return '%s/%s/%s/config' % (DISCOVERY_PREFIX, entity_type, entity_id)
 
 
 def push_discovery(client: mqtt.Client, entity_type: str, entity_name: str, data: Dict):
-    print('adding ' + entity_name)
     client.publish(
         discovery_topic(entity_type, entity_name),
         json.dumps({'name': entity_name, **data}),
@@ -334,13 +338,142 @@ device_push = {
 }
 
 
+class DiscoveryCollector:
+    """Stands for the MQTT client in push_* functions and keeps the generated configs by topic"""
+
+    def __init__(self):
+        self.configs = {}  # type: Dict[str, str]
+
+    def publish(self, topic: str, payload: str = None, qos: int = 0, retain: bool = False):
+        self.configs[topic] = payload
+
+
+def generate_discovery(devices: List[Dict], mqtt_prefix: str, root_id: str) -> Dict[str, str]:
+    collector = DiscoveryCollector()
+    push_noolite_root_device(collector, mqtt_prefix, root_id)
+    for device_info in devices:
+        device_info = dict(device_info)
+        device_type = str(device_info.pop('type'))
+        device_push[device_type](collector, mqtt_prefix, root_id, **device_info)
+    return collector.configs
+
+
+def owned_by(payload: bytes, root_id: str) -> bool:
+    """Tells if a retained config belongs to the bridge with root_id, entity names are not namespaced"""
+    device_info = _device_info(payload)
+    return device_info.get('via_device') == root_id or root_id in device_info.get('identifiers', [])
+
+
+def auto_discovered(payload: bytes) -> bool:
+    """Tells if a retained config was published by the bridge auto-discovery"""
+    return _device_info(payload).get('sw_version') == AUTO_DISCOVERED
+
+
+def _device_info(payload: bytes) -> Dict:
+    try:
+        return json.loads(payload.decode()).get('device', {})
+    except (ValueError, AttributeError):
+        return {}
+
+
+def diff_discovery(existing: Dict[str, bytes], generated: Dict[str, str], root_id: str) -> List[Tuple[str, str]]:
+    """
+    Messages turning the existing retained configs into the generated ones.
+
+    Configs are compared as JSON so formatting and key order don't matter, configs of
+    our entities missing from generated are cleared with an empty payload, unless the
+    bridge auto-discovery published them.
+    """
+    messages = []
+    for topic, payload in sorted(generated.items()):
+        current = existing.get(topic)
+        try:
+            unchanged = current is not None and json.loads(current.decode()) == json.loads(payload)
+        except ValueError:
+            unchanged = False
+        if not unchanged:
+            messages.append((topic, payload))
+
+    for topic, payload in sorted(existing.items()):
+        if topic not in generated and owned_by(payload, root_id) and not auto_discovered(payload):
+            messages.append((topic, ''))
+    return messages
+
+
+def read_retained(client: mqtt.Client, settle: float = 1.0, timeout: float = 30.0) -> Dict[str, bytes]:
+    """
+    Collects retained discovery configs from the broker.
+
+    MQTT has no end marker for retained messages, they are taken as complete when
+    nothing arrives for `settle` seconds after the subscription is acknowledged.
+    """
+    retained = {}
+    state = {'rc': None, 'subscribed': False, 'last_message_at': time()}
+
+    def on_connect(_client: mqtt.Client, _user_data, _flags, rc: int):
+        state['rc'] = rc
+        if rc == 0:
+            client.subscribe('%s/+/+/config' % DISCOVERY_PREFIX, qos=1)
+
+    def on_subscribe(_client: mqtt.Client, _user_data, _mid: int, _granted_qos):
+        state['subscribed'] = True
+        state['last_message_at'] = time()
+
+    def on_message(_client: mqtt.Client, _user_data, msg: mqtt.MQTTMessage):
+        state['last_message_at'] = time()
+        if msg.retain and msg.payload:
+            retained[msg.topic] = msg.payload
+
+    client.on_connect = on_connect
+    client.on_subscribe = on_subscribe
+    client.on_message = on_message
+
+    started_at = time()
+    while not state['subscribed'] or time() - state['last_message_at'] < settle:
+        if time() - started_at > timeout:
+            raise TimeoutError('No complete list of retained discovery configs in %.1f s' % timeout)
+        if state['rc']:
+            raise ConnectionError('MQTT connection refused with result code %d' % state['rc'])
+        client.loop(0.1)
+
+    client.unsubscribe('%s/+/+/config' % DISCOVERY_PREFIX)
+    client.on_message = None
+    return retained
+
+
+def publish_window(client: mqtt.Client, messages: List[Tuple[str, str]], window: int = 16, timeout: float = 30.0):
+    """Publishes retained messages with QoS 1 keeping at most `window` unacknowledged, waits for all acks"""
+    queue = deque(messages)
+    in_flight = set()
+
+    def on_publish(_client: mqtt.Client, _user_data, mid: int):
+        in_flight.discard(mid)
+
+    client.on_publish = on_publish
+
+    started_at = time()
+    while queue or in_flight:
+        if time() - started_at > timeout:
+            raise TimeoutError(
+                '%d discovery messages not acknowledged in %.1f s' % (len(queue) + len(in_flight), timeout)
+            )
+        while queue and len(in_flight) < window:
+            topic, payload = queue.popleft()
+            print('%s %s' % ('removing' if payload == '' else 'publishing', topic))
+            in_flight.add(client.publish(topic, payload, qos=1, retain=True).mid)
+        client.loop(0.1)
+
+
 def send_discovery(
         devices: List[Dict],
         mqtt_host: str,
         mqtt_port: int,
         mqtt_prefix: str,
         username: str = None,
-        password: str = None
+        password: str = None,
+        window: int = 16,
+        settle: float = 1.0,
+        timeout: float = 30.0,
 ):
 
     def on_disconnect(_client: mqtt.Client, _user_data, rc: int):
@@ -355,17 +488,15 @@ def send_discovery(
 
     mqtt_client.connect(mqtt_host, mqtt_port, 60)
 
-    mqtt_client.loop_start()
-
     root_id = mqtt_prefix.replace('/', '_')
 
-    push_noolite_root_device(mqtt_client, mqtt_prefix, root_id)
-    for device_info in devices:
-        device_info = dict(device_info)
-        device_type = str(device_info.pop('type'))
-        device_push[device_type](mqtt_client, mqtt_prefix, root_id, **device_info)
+    generated = generate_discovery(devices, mqtt_prefix, root_id)
+    existing = read_retained(mqtt_client, settle, timeout)
+    messages = diff_discovery(existing, generated, root_id)
+    print('%d configs generated, %d to publish' % (len(generated), len(messages)))
+
+    publish_window(mqtt_client, messages, window, timeout)
 
-    mqtt_client.loop_stop()
     mqtt_client.disconnect()
 
 
@@ -382,6 +513,10 @@ def cli():
     parser.add_argument('password', help='MQTT user password', type=str, nargs='?', default=None)
     parser.add_argument('-p', '--mqtt_port', help='MQTT port', type=int, nargs='?', default=1883)
     parser.add_argument('-d', '--devices', help='devices to discover', type=json_list, required=True)
+    parser.add_argument('--window', help='Maximal number of unacknowledged discovery messages', type=int, default=16)
+    parser.add_argument('--settle', help='Retained configs are complete after this long without new ones, seconds',
+                        type=float, default=1.0)
+    parser.add_argument('--timeout', help='Maximal time for every step of discovery, seconds', type=float, default=30.0)
 
     args = vars(parser.parse_args())
 
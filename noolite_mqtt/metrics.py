@@ -0,0 +1,168 @@
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Callable, Iterable, List, Sequence, Tuple
+
+from .enums import Command, Mode
+
+# Metrics are updated by the bridge loop only and read by the HTTP thread, so plain
+# dict and list updates are used instead of locks: a scrape may see a value one
+# increment behind, which is fine for monitoring.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LOOP_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1)
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, value) for name, value in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), label_format: Callable = None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._label_format = label_format
+        self._values = {} if self.labels else {(): 0}
+
+    def inc(self, key: Tuple = (), amount: int = 1):
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, key: Tuple = ()) -> int:
+        return self._values.get(key, 0)
+
+    def render(self) -> List[str]:
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s counter' % self.name]
+        for key, value in sorted(self._values.items()):
+            if self._label_format is not None:
+                key = self._label_format(key)
+            lines.append('%s%s %s' % (self.name, _format_labels(self.labels, key), value))
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self._buckets = tuple(buckets)
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float):
+        self._counts[bisect_left(self._buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def render(self) -> List[str]:
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        total = 0
+        for bound, count in zip(self._buckets + (float('inf'),), self._counts):
+            total += count
+            lines.append('%s_bucket{le="%s"} %d' % (self.name, '+Inf' if bound == float('inf') else bound, total))
+        lines.append('%s_sum %s' % (self.name, self._sum))
+        lines.append('%s_count %d' % (self.name, self._count))
+        return lines
+
+
+class Collected:
+    """Metric read from the application at scrape time, func returns [(label values, value)]"""
+
+    def __init__(self, name: str, help: str, kind: str, func: Callable[[], Iterable[Tuple[Tuple, float]]],
+                 labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = tuple(labels)
+        self._func = func
+
+    def render(self) -> List[str]:
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s %s' % (self.name, self.kind)]
+        for key, value in self._func():
+            lines.append('%s%s %s' % (self.name, _format_labels(self.labels, key), value))
+        return lines
+
+
+class Metrics:
+    def __init__(self, namespace: str = 'noolite'):
+        self._namespace = namespace
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = (), label_format: Callable = None) -> Counter:
+        return self._add(Counter(self._name(name), help, labels, label_format))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(self._name(name), help, buckets))
+
+    def gauge_func(self, name: str, help: str, func: Callable[[], float]) -> Collected:
+        return self._add(Collected(self._name(name), help, 'gauge', lambda: [((), func())]))
+
+    def collected(self, name: str, help: str, kind: str, func: Callable, labels: Sequence[str] = ()) -> Collected:
+        return self._add(Collected(self._name(name), help, kind, func, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+    def _name(self, name: str) -> str:
+        return '%s_%s' % (self._namespace, name)
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+class MetricsServer:
+    """Serves metrics in Prometheus text format on /metrics from a daemon thread"""
+
+    def __init__(self, metrics: Metrics, port: int, host: str = '127.0.0.1'):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args):
+                pass
+
+        self._server = HTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _enum_name(enum, value: int) -> str:
+    try:
+        return enum(value).name
+    except ValueError:
+        return str(value)
+
+
+def mode_command_labels(key: Tuple[int, int]) -> Tuple[str, str]:
+    """Label values for (mode, command) keys, names are resolved only when scraped"""
+    return _enum_name(Mode, key[0]), _enum_name(Command, key[1])
+
+
+def per_adapter(adapters: Sequence, value: Callable) -> Callable[[], List]:
+    """Collector function reading value(adapter) of every adapter labelled with its index"""
+    return lambda: [((adapter.index,), value(adapter)) for adapter in adapters]
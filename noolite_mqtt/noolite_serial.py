@@ -1,9 +1,106 @@
+import struct
+from typing import Dict, List
+
 import serial
 
 from .enums import Command, Mode, Request
 
+FRAME_SIZE = 17
+# commands sent to the adapter start and end with these bytes
+TX_START = 171
+TX_STOP = 172
+# adapter frames start and end with these bytes
+RX_START = 173
+RX_STOP = 174
+
+_FRAME = struct.Struct('17B')
+
+
+def is_last_frame(frame: bytes) -> bool:
+    """Tells if frame ends the adapter answer, its 4th byte is the number of frames that follow"""
+    return frame[3] == 0
+
+
+class FrameParser:
+    """
+    Incremental parser of MTRF64 frames.
+
+    Bytes are accumulated in a reusable buffer, frames are located by their
+    start/stop bytes and checked with CRC, so a dropped or corrupted byte only
+    costs the broken frame instead of misaligning every following one.
+    """
+
+    def __init__(self, start: int = RX_START, stop: int = RX_STOP, size: int = 256):
+        self._start = start
+        self._stop = stop
+        self._buffer = bytearray(size)
+        self._length = 0
+
+        self.frames = 0
+        self.resyncs = 0
+        self.crc_errors = 0
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Adds received bytes and returns complete valid frames"""
+        buffer = self._buffer
+        length = self._length
+        end = length + len(data)
+        if end > len(buffer):
+            buffer.extend(bytes(end - len(buffer)))
+        buffer[length:end] = data
+
+        frames = []
+        start = self._start
+        stop = self._stop
+        pos = 0
+        with memoryview(buffer) as view:
+            while end - pos >= FRAME_SIZE:
+                if buffer[pos] != start:
+                    # lost frame boundary, skip to the next start byte
+                    self.resyncs += 1
+                    pos = self._next_start(pos + 1, end)
+                    continue
+
+                frame_end = pos + FRAME_SIZE
+                if buffer[frame_end - 1] != stop:
+                    self.resyncs += 1
+                    pos = self._next_start(pos + 1, end)
+                    continue
+
+                if sum(view[pos:frame_end - 2]) & 0xff != buffer[frame_end - 2]:
+                    self.crc_errors += 1
+                    pos = self._next_start(pos + 1, end)
+                    continue
+
+                frames.append(bytes(view[pos:frame_end]))
+                pos = frame_end
+
+            # keep the incomplete tail at the beginning of the buffer
+            view[0:end - pos] = view[pos:end]
+
+        self._length = end - pos
+        self.frames += len(frames)
+        return frames
+
+    def stats(self) -> Dict:
+        return {
+            'frames': self.frames,
+            'resyncs': self.resyncs,
+            'crc_errors': self.crc_errors,
+        }
+
+    def _next_start(self, pos: int, end: int) -> int:
+        pos = self._buffer.find(self._start, pos, end)
+        return end if pos < 0 else pos
+
 
 class NooLiteCommand:
+    __slots__ = ('mode', 'ctr', 'ch', 'cmd', 'fmt', 'd0', 'd1', 'd2', 'd3', 'id0', 'id1', 'id2', 'id3')
+
+    st = TX_START
+    res = 0
+    sp = TX_STOP
+
     def __init__(
             self,
             ch: int,
@@ -14,10 +111,8 @@ class NooLiteCommand:
             d0: int = 0, d1: int = 0, d2: int = 0, d3: int = 0,
             id0: int = 0, id1: int = 0, id2: int = 0, id3: int = 0
     ):
-        self.st = 171
         self.mode = mode
         self.ctr = ctr
-        self.res = 0
         self.ch = ch
         self.cmd = cmd
         self.fmt = fmt
@@ -29,54 +124,61 @@ class NooLiteCommand:
         self.id1 = id1
         self.id2 = id2
         self.id3 = id3
-        self.sp = 172
 
     @property
     def crc(self):
-        crc = sum([
-            self.st,
-            self.mode,
-            self.ctr,
-            self.res,
-            self.ch,
-            self.cmd,
-            self.fmt,
-            self.d0,
-            self.d1,
-            self.d2,
-            self.d3,
-            self.id0,
-            self.id1,
-            self.id2,
-            self.id3,
-        ])
-        return crc if crc < 256 else divmod(crc, 256)[1]
+        return (
+            TX_START + self.mode + self.ctr + self.ch + self.cmd + self.fmt +
+            self.d0 + self.d1 + self.d2 + self.d3 + self.id0 + self.id1 + self.id2 + self.id3
+        ) & 0xff
+
+    def pack_into(self, buffer, offset: int = 0):
+        _FRAME.pack_into(
+            buffer, offset,
+            TX_START, self.mode, self.ctr, 0, self.ch, self.cmd, self.fmt,
+            self.d0, self.d1, self.d2, self.d3, self.id0, self.id1, self.id2, self.id3,
+            self.crc, TX_STOP
+        )
 
     def to_bytes(self):
-        return bytearray([
-            self.st,
-            self.mode,
-            self.ctr,
-            self.res,
-            self.ch,
-            self.cmd,
-            self.fmt,
-            self.d0,
-            self.d1,
-            self.d2,
-            self.d3,
-            self.id0,
-            self.id1,
-            self.id2,
-            self.id3,
-            self.crc,
-            self.sp
-        ])
+        buffer = bytearray(FRAME_SIZE)
+        self.pack_into(buffer)
+        return buffer
+
+
+def _build_frame_cache() -> Dict:
+    cache = {}
+    for mode in (Mode.TX, Mode.TX_F):
+        for cmd in (Command.OFF, Command.ON, Command.TOGGLE, Command.READ_STATE):
+            for ch in range(64):
+                cache[(mode, ch, cmd)] = bytes(NooLiteCommand(ch, cmd, mode).to_bytes())
+    return cache
+
+
+_FRAME_CACHE = _build_frame_cache()
+
+
+def encode_frame(
+        ch: int,
+        cmd: Command,
+        mode: Mode = Mode.TX,
+        ctr: Request = Request.CMD,
+        fmt: int = 0,
+        d0: int = 0, d1: int = 0, d2: int = 0, d3: int = 0,
+        id0: int = 0, id1: int = 0, id2: int = 0, id3: int = 0
+) -> bytes:
+    """Encodes a command frame, common parameterless commands are served from a prebuilt cache"""
+    if ctr == Request.CMD and fmt == d0 == d1 == d2 == d3 == id0 == id1 == id2 == id3 == 0:
+        frame = _FRAME_CACHE.get((mode, ch, cmd))
+        if frame is not None:
+            return frame
+    return bytes(NooLiteCommand(ch, cmd, mode, ctr, fmt, d0, d1, d2, d3, id0, id1, id2, id3).to_bytes())
 
 
 class NooLiteSerial:
     def __init__(self, tty_name):
         self.tty = self._get_tty(tty_name)
+        self._parser = FrameParser()
 
     def on(self, ch, noolite_f: bool = False):
         self.send_command(ch, Command.ON, Mode.TX_F if noolite_f else Mode.TX, Request.CMD)
@@ -100,21 +202,23 @@ class NooLiteSerial:
             d0: int = 0, d1: int = 0, d2: int = 0, d3: int = 0,
             id0: int = 0, id1: int = 0, id2: int = 0, id3: int = 0
     ):
-        command = NooLiteCommand(ch, cmd, mode, ctr, fmt, d0, d1, d2, d3, id0, id1, id2, id3)
-        self.tty.write(command.to_bytes())
-        pass
+        self.tty.write(encode_frame(ch, cmd, mode, ctr, fmt, d0, d1, d2, d3, id0, id1, id2, id3))
+
+    def receive(self) -> List[bytes]:
+        waiting = self.tty.inWaiting()
+        if not waiting:
+            return []
+        return self._parser.feed(self.tty.read(waiting))
+
+    def stats(self) -> Dict:
+        return self._parser.stats()
 
-    def receive(self):
-        all_responses = list()
-        while self.tty.inWaiting() >= 17:
-            bytes_response = list(self.tty.read(17))
-            if bytes_response:
-                all_responses.append(bytes_response)
-                if bytes_response[3] == 0:
-                    break
-            else:
-                break
-        return all_responses
+    def fileno(self):
+        """File descriptor of the serial port for select(), None if the port has no one (e.g. loop://)"""
+        try:
+            return self.tty.fileno()
+        except (AttributeError, OSError, ValueError):
+            return None
 
     @staticmethod
     def _get_tty(tty_name):
@@ -0,0 +1,68 @@
+from collections import OrderedDict, deque
+from typing import Dict, Iterator, Tuple
+
+DROP_OLDEST = 'oldest'
+DROP_COALESCE = 'coalesce'
+
+
+class Outbox:
+    """
+    Bounded buffer of messages published while the broker connection is down.
+
+    With `oldest` policy every message is kept in order and the oldest one is dropped
+    when the buffer is full. With `coalesce` only the latest message of every topic is
+    kept, so state topics take one slot each however often they change, and the topic
+    updated longest ago is dropped when the buffer is full.
+    """
+
+    def __init__(self, max_size: int = 1000, policy: str = DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DROP_COALESCE):
+            raise ValueError('Unknown outbox drop policy: %s' % policy)
+
+        self._max_size = max_size
+        self._coalesce = policy == DROP_COALESCE
+        self._messages = OrderedDict() if self._coalesce else deque()
+
+        self.max_depth = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.flushed = 0
+
+    def __len__(self):
+        return len(self._messages)
+
+    def put(self, topic: str, payload, qos: int = 0, retain: bool = False):
+        if self._coalesce:
+            if topic in self._messages:
+                # the newer value replaces the buffered one and moves to the end of the flush order
+                del self._messages[topic]
+                self.coalesced += 1
+            elif len(self._messages) >= self._max_size:
+                self._messages.popitem(last=False)
+                self.dropped += 1
+            self._messages[topic] = (topic, payload, qos, retain)
+        else:
+            if len(self._messages) >= self._max_size:
+                self._messages.popleft()
+                self.dropped += 1
+            self._messages.append((topic, payload, qos, retain))
+
+        if len(self._messages) > self.max_depth:
+            self.max_depth = len(self._messages)
+
+    def drain(self) -> Iterator[Tuple[str, object, int, bool]]:
+        """Yields buffered (topic, payload, qos, retain) in publish order and empties the buffer"""
+        messages = self._messages.values() if self._coalesce else self._messages
+        self._messages = OrderedDict() if self._coalesce else deque()
+        for message in messages:
+            self.flushed += 1
+            yield message
+
+    def stats(self) -> Dict:
+        return {
+            'depth': len(self._messages),
+            'max_depth': self.max_depth,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'flushed': self.flushed,
+        }
@@ -0,0 +1,163 @@
+from time import monotonic as time
+from typing import Callable, Dict, Optional
+
+from .enums import Command, Mode, Request, Response
+from .noolite_serial import is_last_frame
+from .timers import TimerQueue
+from .tx_queue import TxQueue, TxRequest
+
+# reported when no frame for the request arrived in time
+RESULT_TIMEOUT = 'TIMEOUT'
+
+# commands which change the device state relative to the current one, repeating them is not safe
+NOT_RETRIED = frozenset([
+    Command.BRIGHT_DOWN,
+    Command.BRIGHT_UP,
+    Command.TOGGLE,
+    Command.BRIGHT_BACK,
+    Command.BRIGHT_STEP_DOWN,
+    Command.BRIGHT_STEP_UP,
+    Command.ROLL_COLOR,
+    Command.RGB_MODE,
+    Command.RGB_MODE_BACK,
+])
+
+
+class PendingRequest:
+    def __init__(self, request: TxRequest, sent_at: float):
+        self.request = request
+        self.attempts = 1
+        self.first_sent_at = sent_at
+        self.sent_at = sent_at
+        self.retrying = False
+
+
+class PendingRequests:
+    """
+    Matches nooLite-F commands with adapter responses.
+
+    Every command written to serial is kept by (mode, channel, command) until a response
+    frame for it arrives. NO_RESPONSE answers and missing answers are retried with
+    exponential backoff, the final outcome goes to `on_result(request, result, attempts, rtt)`.
+    """
+
+    def __init__(self, tx_queue: TxQueue, on_result: Callable[[TxRequest, str, int, float], None],
+                 max_attempts: int = 3, timeout: float = 1.0, backoff: float = 0.5):
+        self._tx_queue = tx_queue
+        self._on_result = on_result
+        self._max_attempts = max_attempts
+        self._timeout = timeout
+        self._backoff = backoff
+        self._pending = {}
+        self._timers = TimerQueue()
+
+        self.retries = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def sent(self, request: TxRequest, now: float):
+        """TX queue callback for every written frame"""
+        if request.mode != Mode.TX_F or request.ctr != Request.CMD:
+            return
+
+        key = (request.mode, request.ch, request.cmd)
+        pending = self._pending.get(key)
+        if pending is not None and pending.retrying:
+            pending.attempts += 1
+            pending.sent_at = now
+            pending.retrying = False
+        else:
+            self._pending[key] = PendingRequest(request, now)
+        self._timers.schedule(key, now + self._timeout)
+
+    def dropped(self, request: TxRequest, now: float = None):
+        """TX queue callback for evicted commands, a dropped retry is the final attempt"""
+        if not request.retry:
+            return
+
+        key = (request.mode, request.ch, request.cmd)
+        pending = self._pending.get(key)
+        if pending is not None and pending.retrying and key not in self._timers:
+            self._resolve(key, pending, RESULT_TIMEOUT, time() if now is None else now)
+
+    def on_frame(self, frame: bytes, now: float = None) -> bool:
+        """Resolves the request answered by frame, returns False for unrelated frames"""
+        if frame[1] != Mode.TX_F or not is_last_frame(frame):
+            return False
+
+        key = self._find(frame[4], frame[5])
+        if key is None:
+            return False
+
+        pending = self._pending[key]
+        if pending.retrying and key not in self._timers:
+            # retry is already queued, its own answer will resolve the request
+            return False
+
+        if now is None:
+            now = time()
+        try:
+            result = Response(frame[2]).name
+        except ValueError:
+            result = str(frame[2])
+
+        if frame[2] == Response.NO_RESPONSE:
+            # late answers of timed out attempts don't trigger one more retry
+            if not pending.retrying:
+                self._retry(key, pending, result, now)
+        else:
+            self._resolve(key, pending, result, now)
+        return True
+
+    def next_deadline(self) -> Optional[float]:
+        return self._timers.next_deadline()
+
+    def process(self, now: float = None):
+        """Handles expired response timeouts and retry delays"""
+        if now is None:
+            now = time()
+
+        for key, _ in self._timers.pop_expired(now):
+            pending = self._pending[key]
+            if pending.retrying:
+                request = pending.request
+                # retries are never merged with other commands for the channel
+                if not self._tx_queue.put(request.ch, request.cmd, request.mode, request.ctr, request.priority,
+                                          retry=True, **request.params):
+                    self._resolve(key, pending, RESULT_TIMEOUT, now)
+            else:
+                self._retry(key, pending, RESULT_TIMEOUT, now)
+
+    def stats(self) -> Dict:
+        return {
+            'pending': len(self._pending),
+            'retries': self.retries,
+        }
+
+    def _find(self, ch: int, cmd: int):
+        key = (Mode.TX_F, ch, cmd)
+        if key in self._pending:
+            return key
+        if cmd == Command.SEND_STATE:
+            # state is the answer for READ_STATE and for commands sent with state request format
+            key = (Mode.TX_F, ch, Command.READ_STATE)
+            if key in self._pending:
+                return key
+        # fall back to the oldest request for the channel
+        keys = [k for k in self._pending if k[1] == ch]
+        return min(keys, key=lambda k: self._pending[k].sent_at) if keys else None
+
+    def _retry(self, key, pending: PendingRequest, result: str, now: float):
+        if pending.attempts >= self._max_attempts or pending.request.cmd in NOT_RETRIED:
+            self._resolve(key, pending, result, now)
+            return
+
+        self.retries += 1
+        pending.retrying = True
+        self._timers.schedule(key, now + self._backoff * 2 ** (pending.attempts - 1))
+
+    def _resolve(self, key, pending: PendingRequest, result: str, now: float):
+        del self._pending[key]
+        self._timers.cancel(key)
+        self._on_result(pending.request, result, pending.attempts, now - pending.sent_at)
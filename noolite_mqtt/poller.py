@@ -0,0 +1,87 @@
+from time import monotonic as time
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+def channel_ranges(value: str) -> List[int]:
+    """Parses comma separated channels and ranges, e.g. 0,3,10-15"""
+    channels = []
+    for part in value.split(','):
+        if part == '':
+            continue
+        first, _, last = part.partition('-')
+        channels += range(int(first), int(last or first) + 1)
+    return channels
+
+
+class StatePoller:
+    """
+    Background READ_STATE requests for nooLite-F channels.
+
+    Channels are polled round robin, one request every `period / len(channels)` seconds,
+    so every channel is refreshed once per period without bursts on the radio. Channels
+    which don't answer are polled every 2nd, 4th... round up to `max_backoff`.
+    While `busy(ch)` is true the poll waits `pause` seconds, so user commands go first.
+    """
+
+    def __init__(self, channels: Iterable[int], request: Callable[[int], None], busy: Callable[[int], bool],
+                 period: float = 300.0, max_backoff: int = 16, pause: float = 1.0):
+        self._channels = list(dict.fromkeys(channels))
+        self._request = request
+        self._busy = busy
+        self._interval = period / len(self._channels) if self._channels else period
+        self._max_backoff = max_backoff
+        self._pause = min(pause, self._interval)
+        self._backoff = dict.fromkeys(self._channels, 1)
+        self._skip = dict.fromkeys(self._channels, 0)
+        self._index = 0
+        self._next_at = time()
+
+        self.polls = 0
+        self.pauses = 0
+        self.failures = 0
+
+    def next_deadline(self) -> Optional[float]:
+        return self._next_at if self._channels else None
+
+    def process(self, now: float):
+        if not self._channels or now < self._next_at:
+            return
+
+        for _ in range(len(self._channels)):
+            ch = self._channels[self._index]
+            if self._skip[ch] > 0:
+                # backed off channel gives its slot to the next one
+                self._skip[ch] -= 1
+                self._index = (self._index + 1) % len(self._channels)
+                continue
+
+            if self._busy(ch):
+                self.pauses += 1
+                self._next_at = now + self._pause
+                return
+
+            self._request(ch)
+            self.polls += 1
+            self._index = (self._index + 1) % len(self._channels)
+            break
+        self._next_at = now + self._interval
+
+    def on_result(self, ch: int, answered: bool):
+        """Adapts polling of ch to the result of a READ_STATE request"""
+        if ch not in self._backoff:
+            return
+        if answered:
+            self._backoff[ch] = 1
+        else:
+            self.failures += 1
+            self._backoff[ch] = min(self._backoff[ch] * 2, self._max_backoff)
+        self._skip[ch] = self._backoff[ch] - 1
+
+    def stats(self) -> Dict:
+        return {
+            'channels': len(self._channels),
+            'polls': self.polls,
+            'pauses': self.pauses,
+            'failures': self.failures,
+            'backed_off': sum(1 for backoff in self._backoff.values() if backoff > 1),
+        }
@@ -0,0 +1,145 @@
+import mmap
+import os
+import struct
+from time import monotonic as time, time as wall_time
+from typing import List, Tuple
+
+from .decoders import Topics
+
+MAGIC = b'NOOS'
+VERSION = 1
+
+# magic, version, record size, number of records
+_HEADER = struct.Struct('<4sHHI')
+# flags, last payload, postponed message wall clock deadline and payload
+_RECORD = struct.Struct('<B15sd8s')
+
+_HAS_VALUE = 0x01
+_HAS_TIMER = 0x02
+
+# per channel topics kept in the snapshot and whether their values are numbers
+KINDS = (
+    ('state_f', False),
+    ('brightness_f', False),
+    ('switch', False),
+    ('temperature', True),
+    ('humidity', True),
+    ('battery', True),
+)
+
+
+class Snapshot:
+    """
+    Last known per channel state and postponed messages in a memory-mapped file.
+
+    Every topic of KINDS has a fixed-size record. Updates only change the in-memory
+    record and mark it dirty, dirty records are packed into the map by process() at
+    most every `interval` seconds, so the packet path never touches the file.
+    Postponed message deadlines are stored as wall clock time to survive reboots.
+    """
+
+    def __init__(self, path: str, topics: Topics, interval: float = 1.0):
+        self._interval = interval
+        self._records = {}
+        self._slots = []
+        for kind, numeric in KINDS:
+            for topic in getattr(topics, kind):
+                # slot, numeric, payload, timer deadline, timer payload
+                record = [len(self._slots), numeric, None, None, None]
+                self._records[topic] = record
+                self._slots.append((topic, record))
+        self._dirty = set()
+        self._flushed_at = time()
+
+        size = _HEADER.size + _RECORD.size * len(self._slots)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size != size:
+            os.ftruncate(self._fd, 0)
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+        if _HEADER.unpack_from(self._map, 0) == (MAGIC, VERSION, _RECORD.size, len(self._slots)):
+            self._load()
+        else:
+            # different layout, e.g. another number of adapters, the old state is of no use
+            self._map[:] = bytes(size)
+            _HEADER.pack_into(self._map, 0, MAGIC, VERSION, _RECORD.size, len(self._slots))
+
+    def set_value(self, topic: str, payload):
+        record = self._records.get(topic)
+        if record is not None:
+            record[2] = payload
+            self._dirty.add(record[0])
+
+    def set_timer(self, topic: str, delay: float, payload):
+        record = self._records.get(topic)
+        if record is not None:
+            record[3] = wall_time() + delay
+            record[4] = payload
+            self._dirty.add(record[0])
+
+    def clear_timer(self, topic: str):
+        record = self._records.get(topic)
+        if record is not None and record[3] is not None:
+            record[3] = record[4] = None
+            self._dirty.add(record[0])
+
+    def values(self) -> List[Tuple[str, object]]:
+        """Restored (topic, value) pairs, values of numeric topics are floats"""
+        return [
+            (topic, float(record[2]) if record[1] else record[2])
+            for topic, record in self._slots
+            if record[2] is not None
+        ]
+
+    def timers(self) -> List[Tuple[str, float, str]]:
+        """Restored postponed (topic, seconds left, payload), negative when already expired"""
+        now = wall_time()
+        return [(topic, record[3] - now, record[4]) for topic, record in self._slots if record[3] is not None]
+
+    def next_flush(self):
+        return self._flushed_at + self._interval if self._dirty else None
+
+    def process(self, now: float):
+        if self._dirty and now >= self._flushed_at + self._interval:
+            self.flush()
+            self._flushed_at = now
+
+    def flush(self):
+        """Packs dirty records into the map, the OS writes the pages back to the file"""
+        for slot in self._dirty:
+            _, record = self._slots[slot]
+            flags = 0
+            payload = b''
+            if record[2] is not None:
+                payload = str(record[2]).encode()
+                if len(payload) <= 15:
+                    flags |= _HAS_VALUE
+            timer_payload = b''
+            if record[3] is not None:
+                timer_payload = str(record[4]).encode()
+                if len(timer_payload) <= 8:
+                    flags |= _HAS_TIMER
+            _RECORD.pack_into(
+                self._map, _HEADER.size + slot * _RECORD.size,
+                flags, payload if flags & _HAS_VALUE else b'',
+                record[3] if flags & _HAS_TIMER else 0.0, timer_payload if flags & _HAS_TIMER else b''
+            )
+        self._dirty.clear()
+
+    def close(self):
+        self.flush()
+        self._map.flush()
+        self._map.close()
+        os.close(self._fd)
+
+    def _load(self):
+        for slot, (_, record) in enumerate(self._slots):
+            flags, payload, deadline, timer_payload = _RECORD.unpack_from(
+                self._map, _HEADER.size + slot * _RECORD.size
+            )
+            if flags & _HAS_VALUE:
+                record[2] = payload.rstrip(b'\0').decode()
+            if flags & _HAS_TIMER:
+                record[3] = deadline
+                record[4] = timer_payload.rstrip(b'\0').decode()
@@ -0,0 +1,48 @@
+from time import monotonic as time
+from typing import Dict, Hashable
+
+
+class PublishCache:
+    """
+    Last published value per topic, used to skip publishing values which did not change.
+
+    Numeric values within `deadband` of the last published one count as unchanged.
+    A value is published anyway when the topic was silent for `max_interval` seconds,
+    so consumers relying on periodic updates (e.g. Home Assistant expire_after) keep working.
+    """
+
+    def __init__(self, max_interval: float = 300.0):
+        self._max_interval = max_interval
+        self._last = {}
+
+        self.published = 0
+        self.suppressed = 0
+
+    def __len__(self):
+        return len(self._last)
+
+    def should_publish(self, topic: str, value: Hashable, deadband: float = 0.0, now: float = None) -> bool:
+        """Returns True and remembers value if it has to be published to topic"""
+        if now is None:
+            now = time()
+
+        last = self._last.get(topic)
+        if last is not None and now - last[1] < self._max_interval:
+            last_value = last[0]
+            if value == last_value or (deadband > 0 and abs(value - last_value) <= deadband):
+                self.suppressed += 1
+                return False
+
+        self._last[topic] = (value, now)
+        self.published += 1
+        return True
+
+    def forget(self, topic: str):
+        self._last.pop(topic, None)
+
+    def stats(self) -> Dict:
+        return {
+            'topics': len(self._last),
+            'published': self.published,
+            'suppressed': self.suppressed,
+        }
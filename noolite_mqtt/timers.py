@@ -0,0 +1,65 @@
+import heapq
+from itertools import count
+from typing import Any, Hashable, List, Tuple
+
+_DEADLINE, _SEQ, _KEY, _VALUE, _ACTIVE = range(5)
+
+
+class TimerQueue:
+    """
+    Deadline heap with at most one pending timer per key.
+
+    Scheduling is O(log n), cancellation is O(1): cancelled entries are only
+    marked and get dropped lazily when they reach the top of the heap.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._seq = count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return key in self._entries
+
+    def schedule(self, key: Hashable, deadline: float, value: Any = None):
+        """Sets a timer for key replacing the pending one, if any"""
+        self.cancel(key)
+        entry = [deadline, next(self._seq), key, value, True]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def cancel(self, key: Hashable) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[_ACTIVE] = False
+        # don't let cancelled entries pile up in the heap
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [e for e in self._heap if e[_ACTIVE]]
+            heapq.heapify(self._heap)
+        return True
+
+    def next_deadline(self):
+        """Nearest pending deadline or None when there are no timers"""
+        heap = self._heap
+        while heap and not heap[0][_ACTIVE]:
+            heapq.heappop(heap)
+        return heap[0][_DEADLINE] if heap else None
+
+    def pop_expired(self, now: float) -> List[Tuple[Hashable, Any]]:
+        """Removes and returns (key, value) of all timers with deadline not later than now"""
+        heap = self._heap
+        expired = []
+        while heap and heap[0][_DEADLINE] <= now:
+            entry = heapq.heappop(heap)
+            if entry[_ACTIVE]:
+                del self._entries[entry[_KEY]]
+                expired.append((entry[_KEY], entry[_VALUE]))
+        return expired
+
+    def items(self) -> List[Tuple[Hashable, float, Any]]:
+        """Pending (key, deadline, value) tuples ordered by deadline"""
+        return [(e[_KEY], e[_DEADLINE], e[_VALUE]) for e in sorted(self._entries.values())]
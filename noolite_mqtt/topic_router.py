@@ -0,0 +1,55 @@
+from typing import Callable, Optional, Union
+
+# handler(channel, subcommand, payload), named routes pass the name instead of the channel
+TopicHandler = Callable[[Union[int, str], Optional[str], str], None]
+
+
+class TopicRouter:
+    """
+    Dispatches command topics of the form `<prefix>/<route>/<ch>[/<SUBCOMMAND>]`,
+    or `<prefix>/<route>/<name>[/<SUBCOMMAND>]` for routes added as named.
+
+    Routes are kept in a dict keyed by the first subtopic, so unknown topics
+    are rejected with a single lookup and no regular expressions are involved.
+    """
+
+    def __init__(self, prefix: str):
+        self._prefix = prefix + '/'
+        self._prefix_len = len(self._prefix)
+        self._routes = {}
+        self._named = set()
+
+    def add(self, route: str, handler: TopicHandler, named: bool = False):
+        self._routes[route] = handler
+        if named:
+            self._named.add(route)
+
+    def subscriptions(self, qos: int = 0):
+        return [('%s%s/#' % (self._prefix, route), qos) for route in self._routes]
+
+    def route(self, topic: str, payload: str) -> bool:
+        """Calls the handler for topic, returns False if the topic is not routable"""
+        if not topic.startswith(self._prefix):
+            return False
+
+        parts = topic[self._prefix_len:].split('/')
+        handler = self._routes.get(parts[0])
+        if handler is None:
+            return False
+
+        if len(parts) == 2:
+            sub = None
+        elif len(parts) == 3:
+            sub = parts[2]
+        else:
+            return False
+
+        ch = parts[1]
+        if parts[0] in self._named:
+            handler(ch, sub, payload)
+            return True
+        if not ch.isdecimal():
+            return False
+
+        handler(int(ch), sub, payload)
+        return True
@@ -0,0 +1,298 @@
+from collections import deque
+from time import monotonic as time
+from typing import Dict
+
+from .enums import Command, Mode, Request
+from .noolite_serial import NooLiteSerial, is_last_frame
+
+PACING_FIXED = 'fixed'
+PACING_RESPONSE = 'response'
+
+# TX priority classes, highest first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_AUTOMATION = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = ('interactive', 'automation', 'background')
+
+# commands which override the queued one of the same class for the channel
+COALESCED = {
+    Command.OFF: 'state',
+    Command.ON: 'state',
+    Command.TOGGLE: 'state',
+    Command.BRIGHT_SET: 'brightness',
+}
+# outcome of a queued state command followed by TOGGLE, None when they cancel each other
+_TOGGLED = {
+    Command.OFF: Command.ON,
+    Command.ON: Command.OFF,
+    Command.TOGGLE: None,
+}
+
+
+class TxRequest:
+    def __init__(self, ch: int, cmd: Command, mode: Mode, ctr: Request, params: Dict, enqueued_at: float,
+                 priority: int = PRIORITY_INTERACTIVE, burst: bool = False, retry: bool = False):
+        self.ch = ch
+        self.cmd = cmd
+        self.mode = mode
+        self.ctr = ctr
+        self.params = params
+        self.enqueued_at = enqueued_at
+        self.priority = priority
+        self.burst = burst
+        # repeated attempt of a nooLite-F command tracked by PendingRequests
+        self.retry = retry
+        self.sent_at = None
+
+
+class TxQueue:
+    """
+    Bounded transmit queue for the MTRF64 adapter.
+
+    Commands are only enqueued by MQTT callbacks, the owner loop calls process()
+    which writes frames to serial keeping at least `interval` seconds between them.
+
+    With `response` pacing a nooLite-F command holds the queue only until the adapter
+    answers it (received frames are passed to on_frame()) or `response_timeout` passes,
+    plain nooLite commands are followed by the shorter `tx_gap`.
+
+    Commands wait in per priority class queues and higher classes always go first,
+    a full queue makes room for a command by dropping the newest one of a lower class.
+    With `rate` set, a token bucket of `burst` tokens refilled at `rate` per second
+    limits the long term command rate, background commands leave half of the bucket
+    to the other classes. Commands put with `burst` (group fan-out) are followed by
+    `tx_gap` unless a nooLite-F response is awaited.
+
+    A state (ON/OFF/TOGGLE) or BRIGHT_SET command replaces the queued command of the
+    same class for the channel unless another command or a retry for the channel was
+    queued after it, so only the latest slider position or switch outcome is transmitted.
+    """
+
+    def __init__(self, serial: NooLiteSerial, interval: float = 0.3, max_size: int = 64,
+                 pacing: str = PACING_FIXED, response_timeout: float = 0.5, tx_gap: float = 0.1,
+                 rate: float = None, burst: float = 5.0):
+        if pacing not in (PACING_FIXED, PACING_RESPONSE):
+            raise ValueError('Unknown TX pacing: %s' % pacing)
+        if rate is not None and burst < 1:
+            raise ValueError('TX burst should allow at least one command')
+
+        self._serial = serial
+        self._interval = interval
+        self._max_size = max_size
+        self._pacing = pacing
+        self._response_timeout = response_timeout
+        self._tx_gap = tx_gap
+        self._queues = [deque() for _ in PRIORITY_NAMES]
+        self._size = 0
+        self._next_send = 0.0
+        self._awaiting = None
+
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._refilled_at = time()
+        self._token_blocked = None
+        # tokens which have to be left in the bucket to send a command of the class
+        self._min_tokens = (1.0, 1.0, min(burst, 1.0 + burst / 2))
+
+        # callback(request, sent_at) for every written frame
+        self.on_sent = None
+        # callback(request) for every queued command evicted by a higher class one
+        self.on_dropped = None
+
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.responses = 0
+        self.response_timeouts = 0
+        self.response_total = 0.0
+        self.response_max = 0.0
+        self.class_sent = [0] * len(PRIORITY_NAMES)
+        self.class_wait_total = [0.0] * len(PRIORITY_NAMES)
+        self.class_wait_max = [0.0] * len(PRIORITY_NAMES)
+
+    def __len__(self):
+        return self._size
+
+    def depth(self, max_priority: int = PRIORITY_BACKGROUND) -> int:
+        """Number of queued commands of max_priority class and higher"""
+        return sum(len(queue) for queue in self._queues[:max_priority + 1])
+
+    def put(self, ch: int, cmd: Command, mode: Mode = Mode.TX, ctr: Request = Request.CMD,
+            priority: int = PRIORITY_INTERACTIVE, coalesce: bool = True, burst: bool = False, retry: bool = False,
+            **params) -> bool:
+        coalesce = coalesce and not retry and ctr == Request.CMD and cmd in COALESCED
+        if coalesce and self._coalesce(ch, cmd, mode, priority, params):
+            return True
+
+        if self._size >= self._max_size and not self._evict(priority):
+            self.dropped += 1
+            print('TX queue is full, dropping command %d for channel %d' % (cmd, ch))
+            return False
+
+        self._queues[priority].append(TxRequest(ch, cmd, mode, ctr, params, time(), priority, burst, retry))
+        self._size += 1
+        if self._token_blocked is not None and priority < self._token_blocked:
+            # the bucket may have enough tokens for this class already
+            self._token_blocked = None
+            self._next_send = self._refilled_at
+        if self._size > self.max_depth:
+            self.max_depth = self._size
+        return True
+
+    def next_deadline(self):
+        """Monotonic time when the queue needs processing, None if nothing is queued or awaited"""
+        if not self._size and self._awaiting is None:
+            return None
+        return self._next_send
+
+    def process(self, now: float = None) -> int:
+        """Writes frames whose time slot has come, returns the number of frames written"""
+        if now is None:
+            now = time()
+
+        if self._awaiting is not None and now >= self._next_send:
+            self.response_timeouts += 1
+            self._awaiting = None
+
+        sent = 0
+        while self._size and now >= self._next_send:
+            queue = self._head()
+            if self._rate is not None and not self._take_token(queue[0].priority, now):
+                break
+            request = queue.popleft()
+            self._size -= 1
+            self._serial.send_command(request.ch, request.cmd, request.mode, request.ctr, **request.params)
+            request.sent_at = now
+            if self.on_sent is not None:
+                self.on_sent(request, now)
+
+            wait = now - request.enqueued_at
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+            priority = request.priority
+            self.class_sent[priority] += 1
+            self.class_wait_total[priority] += wait
+            if wait > self.class_wait_max[priority]:
+                self.class_wait_max[priority] = wait
+
+            self.sent += 1
+            sent += 1
+            self._next_send = self._pace(request, now)
+        return sent
+
+    def on_frame(self, frame: bytes, now: float = None) -> bool:
+        """Releases the queue when frame is the adapter response to the command in flight"""
+        request = self._awaiting
+        if request is None or frame[1] != request.mode or frame[4] != request.ch or not is_last_frame(frame):
+            return False
+
+        if now is None:
+            now = time()
+        elapsed = now - request.sent_at
+        self.responses += 1
+        self.response_total += elapsed
+        if elapsed > self.response_max:
+            self.response_max = elapsed
+
+        self._awaiting = None
+        self._next_send = now
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            'depth': self._size,
+            'max_depth': self.max_depth,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'wait_avg': self.wait_total / self.sent if self.sent else 0.0,
+            'wait_max': self.wait_max,
+            'responses': self.responses,
+            'response_timeouts': self.response_timeouts,
+            'response_avg': self.response_total / self.responses if self.responses else 0.0,
+            'response_max': self.response_max,
+            'classes': {
+                name: {
+                    'depth': len(self._queues[priority]),
+                    'sent': self.class_sent[priority],
+                    'wait_avg': self.class_wait_total[priority] / self.class_sent[priority]
+                    if self.class_sent[priority] else 0.0,
+                    'wait_max': self.class_wait_max[priority],
+                }
+                for priority, name in enumerate(PRIORITY_NAMES)
+            },
+        }
+
+    def _head(self) -> deque:
+        for queue in self._queues:
+            if queue:
+                return queue
+
+    def _coalesce(self, ch: int, cmd: Command, mode: Mode, priority: int, params: Dict) -> bool:
+        """Merges the command into the latest queued one for the channel, False if it has to be queued"""
+        queue = self._queues[priority]
+        for index in range(len(queue) - 1, -1, -1):
+            request = queue[index]
+            if request.ch != ch or request.mode != mode:
+                continue
+            if request.retry or request.ctr != Request.CMD or COALESCED.get(request.cmd) != COALESCED[cmd]:
+                # reordering around a different command would change the outcome,
+                # a rewritten retry would leave its pending request without an answer
+                return False
+
+            self.coalesced += 1
+            if cmd == Command.TOGGLE:
+                cmd = _TOGGLED[request.cmd]
+                if cmd is None:
+                    del queue[index]
+                    self._size -= 1
+                    return True
+                params = {}
+            # keeps the place and enqueue time of the replaced command, so a moving slider is not starved
+            request.cmd = cmd
+            request.params = params
+            return True
+        return False
+
+    def _evict(self, priority: int) -> bool:
+        """Drops the newest command of the lowest class below priority, False if there is none"""
+        for queue in reversed(self._queues[priority + 1:]):
+            if queue:
+                request = queue.pop()
+                self._size -= 1
+                self.dropped += 1
+                print('TX queue is full, dropping command %d for channel %d' % (request.cmd, request.ch))
+                if self.on_dropped is not None:
+                    self.on_dropped(request)
+                return True
+        return False
+
+    def _take_token(self, priority: int, now: float) -> bool:
+        tokens = min(self._burst, self._tokens + (now - self._refilled_at) * self._rate)
+        self._refilled_at = now
+        needed = self._min_tokens[priority]
+        if tokens < needed:
+            self._tokens = tokens
+            # come back when the bucket has enough tokens for the command
+            self._next_send = now + (needed - tokens) / self._rate
+            self._token_blocked = priority
+            return False
+        self._tokens = tokens - 1.0
+        self._token_blocked = None
+        return True
+
+    def _pace(self, request: TxRequest, now: float) -> float:
+        if self._pacing == PACING_RESPONSE:
+            if request.mode == Mode.TX_F:
+                self._awaiting = request
+                return now + self._response_timeout
+            if request.mode == Mode.TX:
+                return now + self._tx_gap
+        if request.burst:
+            return now + self._tx_gap
+        return now + self._interval
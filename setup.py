@@ -15,7 +15,7 @@ setuptools.setup(
     packages=['noolite_mqtt'],
     install_requires=[
         'pyserial',
-        'paho-mqtt',
+        'paho-mqtt>=1.5',
     ],
     scripts=[
         'noolite_mqtt/noolite_cli.py',
@@ -26,6 +26,7 @@ setuptools.setup(
         'console_scripts': [
             'noolite-mqtt=noolite_mqtt:cli',
             'noolite-mqtt-ha-discover=noolite_mqtt.hass_discover:cli',
+            'noolite-mqtt-emulator=noolite_mqtt.emulator:cli',
         ],
     },
     classifiers=[
@@ -0,0 +1,11 @@
+from noolite_mqtt.enums import Mode
+
+
+class FakeSerial:
+    """Records commands passed to NooLiteSerial.send_command() instead of writing frames"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send_command(self, ch, cmd, mode=Mode.TX, ctr=0, **params):
+        self.sent.append((ch, cmd, mode, ctr, params))
@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+import os
+import sys
+from time import monotonic as time, sleep
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.adapter import Adapter  # noqa: E402
+from noolite_mqtt.emulator import MTRF64Emulator  # noqa: E402
+from noolite_mqtt.enums import Command, Mode  # noqa: E402
+from noolite_mqtt.noolite_serial import NooLiteSerial  # noqa: E402
+from noolite_mqtt.tx_queue import PACING_RESPONSE  # noqa: E402
+
+
+def test_adapters_are_paced_independently():
+    slow = MTRF64Emulator(ack_delay=1.0).start()
+    fast = MTRF64Emulator(ack_delay=0.01).start()
+    results = []
+
+    def on_result(adapter, request, result, _attempts, _rtt):
+        results.append((adapter.index, adapter.offset + request.ch, Command(request.cmd).name, result))
+
+    tx_options = {'pacing': PACING_RESPONSE, 'response_timeout': 2.0}
+    adapters = [
+        Adapter(index, NooLiteSerial(emulator.device), on_result, tx_options, {'timeout': 3.0})
+        for index, emulator in enumerate((slow, fast))
+    ]
+    try:
+        for adapter in adapters:
+            adapter.tx_queue.put(5, Command.ON, Mode.TX_F)
+            adapter.tx_queue.put(6, Command.OFF, Mode.TX_F)
+
+        started_at = time()
+        while len(results) < 2 and time() - started_at < 2.0:
+            for adapter in adapters:
+                for frame in adapter.receive():
+                    adapter.on_frame(frame)
+                adapter.process(time())
+            sleep(0.005)
+    finally:
+        slow.close()
+        fast.close()
+
+    # the second adapter got through its queue while the first still waits for an answer
+    assert results == [(1, 69, 'ON', 'SUCCESS'), (1, 70, 'OFF', 'SUCCESS')]
+    assert len(adapters[0].tx_queue) == 1
@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.aggregate import WindowAggregator  # noqa: E402
+
+
+def test_sample_window():
+    aggregator = WindowAggregator(['t/1', 't/2'], samples=3)
+
+    assert aggregator.add('t/3', 1.0, '1.0', 100.0) is None
+    assert aggregator.add('t/1', 21.5, '21.5', 100.0) == []
+    assert aggregator.add('t/2', 50.0, '50', 100.0) == []
+    assert aggregator.add('t/1', 20.0, '20.0', 101.0) == []
+    assert aggregator.add('t/1', 22.0, '22.0', 102.0) == [
+        ('t/1/min', '20.0'),
+        ('t/1/max', '22.0'),
+        ('t/1/mean', '21.17'),
+        ('t/1/last', '22.0'),
+    ]
+    # the next window starts empty
+    assert aggregator.add('t/1', 19.0, '19.0', 103.0) == []
+    assert aggregator.stats() == {'topics': 2, 'samples': 5, 'windows': 1}
+
+
+def test_time_window():
+    aggregator = WindowAggregator(['h/1'], seconds=60.0, samples=100)
+
+    aggregator.add('h/1', 40, '40', 100.0)
+    aggregator.add('h/1', 45, '45', 130.0)
+    assert aggregator.next_deadline() == 160.0
+    assert aggregator.process(159.0) == []
+    assert aggregator.process(160.0) == [('h/1/min', '40'), ('h/1/max', '45'), ('h/1/mean', '42.5'), ('h/1/last', '45')]
+    assert aggregator.next_deadline() is None
+
+    aggregator.add('h/1', 50, '50', 170.0)
+    assert aggregator.next_deadline() == 230.0
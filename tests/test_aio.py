@@ -0,0 +1,35 @@
+#!/usr/bin/python3
+import asyncio
+import os
+import pty
+import sys
+import tty
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.aio import AsyncNooLiteSerial  # noqa: E402
+from noolite_mqtt.enums import Command, Mode  # noqa: E402
+
+
+def test_async_serial_reads_frames():
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    body = [173, Mode.RX, 0, 0, 7, Command.TOGGLE, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+    frame = bytes(body + [sum(body) & 0xff, 174])
+    serial = AsyncNooLiteSerial(os.ttyname(slave))
+
+    async def read_two():
+        serial.attach(asyncio.get_event_loop())
+        asyncio.get_event_loop().call_later(0.05, os.write, master, frame * 2)
+        result = [await serial.read_packet(), await serial.read_packet()]
+        serial.detach()
+        return result
+
+    loop = asyncio.new_event_loop()
+    try:
+        packets = loop.run_until_complete(asyncio.wait_for(read_two(), 2.0))
+    finally:
+        loop.close()
+        os.close(master)
+        os.close(slave)
+
+    assert [bytes(p) for p in packets] == [frame, frame]
@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+import json
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.auto_discovery import AutoDiscovery  # noqa: E402
+from noolite_mqtt.enums import Command  # noqa: E402
+
+
+def test_first_frame_announces_device():
+    discovery = AutoDiscovery('noolite')
+
+    messages = discovery.observe(3, Command.SENSOR_TEMP_HUM)
+    assert [topic for topic, _ in messages] == [
+        'homeassistant/binary_sensor/noolite/config',
+        'homeassistant/sensor/noolite_humidity_3/config',
+        'homeassistant/sensor/noolite_temperature_3/config',
+    ]
+    assert json.loads(messages[2][1])['state_topic'] == 'noolite/temperature/3'
+
+    assert discovery.observe(3, Command.SENSOR_TEMP_HUM) is None
+    assert discovery.observe(3, Command.BATTERY_LOW) is None
+    assert [topic for topic, _ in discovery.observe(4, Command.TOGGLE)] == [
+        'homeassistant/binary_sensor/noolite_button_4/config',
+    ]
+    assert len(discovery) == 2
+
+
+def test_announced_channels_survive_restart(tmp_path):
+    state_file = str(tmp_path / 'discovery.json')
+    AutoDiscovery('noolite', state_file=state_file).observe(5, Command.TEMPORARY_ON)
+
+    discovery = AutoDiscovery('noolite', state_file=state_file)
+    assert discovery.observe(5, Command.TEMPORARY_ON) is None
+    assert [topic for topic, _ in discovery.observe(6, Command.TEMPORARY_ON)] == [
+        'homeassistant/binary_sensor/noolite_motion_6/config',
+    ]
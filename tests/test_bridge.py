@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+import asyncio
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+from time import monotonic as time, sleep
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import paho.mqtt.client as mqtt  # noqa: E402
+
+from noolite_mqtt import NooLiteMQTT  # noqa: E402
+from noolite_mqtt.aio import AsyncNooLiteMQTT  # noqa: E402
+from noolite_mqtt.emulator import MTRF64Emulator  # noqa: E402
+
+
+class FakeClient:
+    """paho Client stand-in whose connection is dropped by loop_misc() on request, like on keepalive timeout"""
+
+    def __init__(self, *_args, **_kwargs):
+        self._sock = self._peer = None
+        self.published = []
+        self.reconnects = 0
+        self.drop = False
+        self.on_connect = self.on_disconnect = self.on_message = None
+        self.on_socket_open = self.on_socket_close = None
+        self.on_socket_register_write = self.on_socket_unregister_write = None
+
+    def username_pw_set(self, *_args):
+        pass
+
+    def will_set(self, *_args):
+        pass
+
+    def connect(self, *_args):
+        self._open()
+
+    def reconnect(self):
+        self.reconnects += 1
+        self._open()
+        self.on_connect(self, None, {}, 0)
+
+    def subscribe(self, *_args):
+        pass
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        info = mqtt.MQTTMessageInfo(len(self.published))
+        if self._sock is None:
+            info.rc = mqtt.MQTT_ERR_NO_CONN
+        else:
+            self.published.append((topic, payload))
+        return info
+
+    def socket(self):
+        return self._sock
+
+    def want_write(self):
+        return False
+
+    def loop(self, timeout=1.0):
+        if self._sock is None:
+            return mqtt.MQTT_ERR_NO_CONN
+        select.select([self._sock], [], [], timeout)
+        return self.loop_misc()
+
+    def loop_read(self):
+        pass
+
+    def loop_write(self):
+        pass
+
+    def loop_misc(self):
+        if self.drop and self._sock is not None:
+            self.drop = False
+            sock, self._sock = self._sock, None
+            if self.on_socket_close is not None:
+                self.on_socket_close(self, None, sock)
+            sock.close()
+            self._peer.close()
+            self.on_disconnect(self, None, mqtt.MQTT_ERR_KEEPALIVE)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def _open(self):
+        self._sock, self._peer = socket.socketpair()
+        if self.on_socket_open is not None:
+            self.on_socket_open(self, None, self._sock)
+
+
+def wait_for(condition, timeout=10.0):
+    started_at = time()
+    while not condition() and time() - started_at < timeout:
+        sleep(0.01)
+    return condition()
+
+
+def run_reconnect(monkeypatch, bridge_class, engine):
+    """Drops the connection twice, the second time with a sensor frame received while disconnected"""
+    monkeypatch.setattr(mqtt, 'Client', FakeClient)
+    broker = socket.socket()
+    broker.bind(('127.0.0.1', 0))
+    broker.listen(4)
+    emulator = MTRF64Emulator().start()
+    bridge = bridge_class(emulator.device, '127.0.0.1', broker.getsockname()[1], 'home', echo='off',
+                          engine=engine, reconnect_min_delay=0.2)
+    client = bridge._mqtt_client
+    outcome = {}
+
+    def drive():
+        try:
+            wait_for(lambda: client.published)
+            # nothing else wakes the loop up, the reconnect timer has to
+            client.drop = True
+            outcome['reconnected'] = wait_for(lambda: client.reconnects == 1, 3.0)
+            client.drop = True
+            wait_for(lambda: client.socket() is None)
+            emulator.schedule(emulator._temp_hum_frame(3))
+            outcome['flushed'] = wait_for(lambda: client.reconnects == 2 and bridge._outbox.flushed)
+        finally:
+            bridge.stop()
+
+    handlers = [(signum, signal.getsignal(signum)) for signum in (signal.SIGINT, signal.SIGTERM)]
+    thread = threading.Thread(target=drive)
+    thread.start()
+    try:
+        if bridge_class is AsyncNooLiteMQTT:
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(bridge.run())
+            finally:
+                loop.close()
+        else:
+            bridge.loop()
+    finally:
+        thread.join()
+        for signum, handler in handlers:
+            signal.signal(signum, handler)
+        emulator.close()
+        broker.close()
+
+    assert outcome['reconnected']
+    assert outcome['flushed']
+    topics = [topic for topic, _ in client.published]
+    # the will replaced Online meanwhile, values published while disconnected follow the new Online
+    assert topics.count('home/LWT') == 3
+    assert topics.index('home/temperature/3') > topics.index('home/LWT', 2)
+
+
+def test_select_engine_reconnects(monkeypatch):
+    run_reconnect(monkeypatch, NooLiteMQTT, 'select')
+
+
+def test_poll_engine_reconnects(monkeypatch):
+    run_reconnect(monkeypatch, NooLiteMQTT, 'poll')
+
+
+def test_asyncio_engine_reconnects(monkeypatch):
+    run_reconnect(monkeypatch, AsyncNooLiteMQTT, 'asyncio')
+
+
+def test_brightness_out_of_range_is_rejected(monkeypatch):
+    monkeypatch.setattr(mqtt, 'Client', FakeClient)
+    emulator = MTRF64Emulator().start()
+    try:
+        bridge = NooLiteMQTT(emulator.device, '127.0.0.1', 1883, 'home', echo='off')
+        for payload in (b'300', b'-1', b'abc', b'255'):
+            message = mqtt.MQTTMessage(topic=b'home/tx-f/5/BRIGHTNESS')
+            message.payload = payload
+            bridge._on_message(bridge._mqtt_client, None, message)
+
+        tx_queue = bridge.adapters[0].tx_queue
+        assert len(tx_queue) == 1
+        assert tx_queue.process() == 1
+    finally:
+        emulator.close()
+
+
+def test_in_flight_messages(monkeypatch):
+    monkeypatch.setattr(mqtt, 'Client', FakeClient)
+    emulator = MTRF64Emulator().start()
+    try:
+        bridge = NooLiteMQTT(emulator.device, '127.0.0.1', 1883, 'home', echo='off', metrics_port=0)
+    finally:
+        emulator.close()
+    client = bridge._mqtt_client
+    bridge._metrics_server.stop()
+
+    def in_flight():
+        return [line for line in bridge._metrics.render().splitlines() if line.startswith('noolite_mqtt_in_flight ')]
+
+    bridge.publish('home/a', '1')
+    bridge.publish('home/b', '2', qos=1)
+    bridge._on_publish(client, None, 0)
+    # paho may report a QoS 0 message written before publish() returns its mid
+    bridge._on_publish(client, None, 2)
+    bridge.publish('home/c', '3')
+    bridge.publish('home/d', '4')
+    assert in_flight() == ['noolite_mqtt_in_flight 2']
+
+    # the unwritten QoS 0 message is lost with the connection, the will is replaced by Online
+    bridge._on_disconnect(client, None, mqtt.MQTT_ERR_KEEPALIVE)
+    bridge._on_connect(client, None, {}, 0)
+    assert in_flight() == ['noolite_mqtt_in_flight 2']
+    bridge._on_publish(client, None, 4)
+    bridge._on_publish(client, None, 1)
+    assert in_flight() == ['noolite_mqtt_in_flight 0']
+    assert 'noolite_mqtt_published_total 5' in bridge._metrics.render().splitlines()
+
+
+def test_refused_connection_stops(monkeypatch):
+    monkeypatch.setattr(mqtt, 'Client', FakeClient)
+    emulator = MTRF64Emulator().start()
+    try:
+        bridge = NooLiteMQTT(emulator.device, '127.0.0.1', 1883, 'home', echo='off')
+    finally:
+        emulator.close()
+    client = bridge._mqtt_client
+
+    bridge._on_connect(client, None, {}, mqtt.CONNACK_REFUSED_NOT_AUTHORIZED)
+    bridge._on_disconnect(client, None, mqtt.MQTT_ERR_CONN_REFUSED)
+
+    assert bridge._exit
+    assert bridge._reconnect_at is None
+
+
+def test_engine_is_validated():
+    for engine in ('asyncio', 'epoll'):
+        try:
+            NooLiteMQTT('/dev/null', '127.0.0.1', 1883, 'home', engine=engine)
+        except ValueError as e:
+            assert engine in str(e)
+            continue
+        assert False, engine
@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.decoders import Topics, default_decoders  # noqa: E402
+from noolite_mqtt.enums import Command, Mode  # noqa: E402
+
+
+class FakeBridge:
+    def __init__(self):
+        self.topics = Topics('noolite')
+        self.temperature_deadband = self.humidity_deadband = self.battery_deadband = 0.0
+        self.published = []
+        self.postponed = {}
+
+    def publish(self, topic, payload, retain=False):
+        self.published.append((topic, payload))
+
+    def publish_state(self, topic, payload, value=None, deadband=0.0, retain=False):
+        self.published.append((topic, payload))
+
+    def postpone(self, topic, delay, payload):
+        self.postponed[topic] = (delay, payload)
+
+    def cancel_postponed(self, topic):
+        self.postponed.pop(topic, None)
+
+
+def decode(bridge, mode, ch, cmd, d0=0, d1=0, d2=0, d3=0):
+    packet = bytes([173, mode, 0, 0, ch, cmd, 0, d0, d1, d2, d3, 0, 0, 0, 0, 0, 174])
+    decoder = default_decoders().get(mode, cmd)
+    decoder(bridge, ch, packet)
+
+
+def test_topics():
+    topics = Topics('home/noolite')
+
+    assert len(topics) == 64
+    assert topics.switch[5] == 'home/noolite/switch/5'
+    assert topics.brightness_f[63] == 'home/noolite/state-f/63/brightness'
+
+
+def test_negative_temperature():
+    bridge = FakeBridge()
+    # -12.5 as signed 12-bit value 0xf83
+    decode(bridge, Mode.RX, 3, Command.SENSOR_TEMP_HUM, 0x83, 0x2f, 45, 150)
+
+    assert bridge.published == [
+        ('noolite/temperature/3', '-12.5'),
+        ('noolite/humidity/3', '45'),
+        ('noolite/battery/3', '3.00'),
+    ]
+
+
+def test_motion_sensor_postpones_off():
+    bridge = FakeBridge()
+    decode(bridge, Mode.RX, 7, Command.TEMPORARY_ON, 36)
+
+    assert bridge.published == [('noolite/switch/7', 'ON')]
+    assert bridge.postponed == {'noolite/switch/7': (180, 'OFF')}
+
+    decode(bridge, Mode.RX, 7, Command.OFF)
+    assert bridge.postponed == {}
+
+
+def test_state_and_unknown_frames():
+    bridge = FakeBridge()
+    decode(bridge, Mode.TX_F, 2, Command.SEND_STATE, 0, 0, 1, 128)
+
+    assert bridge.published == [('noolite/state-f/2', 'ON'), ('noolite/state-f/2/brightness', '128')]
+    assert default_decoders().get(Mode.TX, Command.ON) is None
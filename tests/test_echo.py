@@ -0,0 +1,37 @@
+#!/usr/bin/python3
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.decoders import Topics  # noqa: E402
+from noolite_mqtt.echo import Echo, parse_echo_filter  # noqa: E402
+from noolite_mqtt.enums import Command, Mode  # noqa: E402
+
+
+def packet(mode, ch, cmd):
+    return bytes([173, mode, 0, 0, ch, cmd] + [0] * 11)
+
+
+def test_text_and_binary_payloads():
+    topics = Topics('noolite')
+    frame = packet(Mode.RX, 3, Command.TOGGLE)
+
+    assert Echo('noolite', topics.echo).message(3, frame) == ('noolite/echo/3', '[%s]' % ','.join(map(str, frame)))
+    assert Echo('noolite', topics.echo, 'binary', aggregate=True).message(3, frame) == ('noolite/echo', frame)
+
+
+def test_filter_and_sample():
+    echo = Echo('noolite', Topics('noolite').echo, sample=2, filters=[
+        parse_echo_filter('RX:TOGGLE'), parse_echo_filter('2'),
+    ])
+
+    assert echo.message(1, packet(Mode.RX, 1, Command.ON)) is None
+    assert echo.message(1, packet(Mode.RX, 1, Command.TOGGLE)) is not None
+    assert echo.message(1, packet(Mode.TX_F, 1, Command.SEND_STATE)) is None
+    assert echo.message(1, packet(Mode.TX_F, 1, Command.SEND_STATE)) is not None
+
+
+def test_parse_echo_filter():
+    assert parse_echo_filter('rx_f:temporary_on') == (Mode.RX_F, Command.TEMPORARY_ON)
+    assert parse_echo_filter('1:21') == (1, 21)
+    assert parse_echo_filter('TX_F:*') == (Mode.TX_F, None)
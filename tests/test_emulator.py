@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+import os
+import sys
+from time import monotonic as time, sleep
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.emulator import MTRF64Emulator  # noqa: E402
+from noolite_mqtt.enums import Command, Mode, Response  # noqa: E402
+from noolite_mqtt.noolite_serial import NooLiteSerial  # noqa: E402
+
+
+def receive(serial, count, timeout=2.0):
+    frames = []
+    started_at = time()
+    while len(frames) < count and time() - started_at < timeout:
+        frames += serial.receive()
+        sleep(0.01)
+    return frames
+
+
+def test_read_state_reports_device_state():
+    emulator = MTRF64Emulator(ack_delay=0.01).start()
+    try:
+        serial = NooLiteSerial(emulator.device)
+        serial.send_command(5, Command.ON, Mode.TX_F)
+        serial.send_command(5, Command.READ_STATE, Mode.TX_F)
+        frames = receive(serial, 2)
+    finally:
+        emulator.close()
+
+    assert [(f[1], f[2], f[4], f[5]) for f in frames] == [
+        (Mode.TX_F, Response.SUCCESS, 5, Command.ON),
+        (Mode.TX_F, Response.SUCCESS, 5, Command.SEND_STATE),
+    ]
+    assert frames[1][9] == 1
+    assert serial.stats()['crc_errors'] == 0
+
+
+def test_loss_answers_no_response():
+    emulator = MTRF64Emulator(ack_delay=0.0, loss=1.0).start()
+    try:
+        serial = NooLiteSerial(emulator.device)
+        serial.send_command(1, Command.ON, Mode.TX_F)
+        frames = receive(serial, 1)
+    finally:
+        emulator.close()
+
+    assert frames[0][2] == Response.NO_RESPONSE
+    assert 1 not in emulator.devices
+
+
+def test_synthetic_traffic():
+    emulator = MTRF64Emulator(temp_hum_rate=200, motion_rate=200, temp_hum_channels=[1, 2], seed=1).start()
+    try:
+        serial = NooLiteSerial(emulator.device)
+        frames = receive(serial, 20)
+    finally:
+        emulator.close()
+
+    assert len(frames) >= 20
+    assert {f[5] for f in frames} == {Command.SENSOR_TEMP_HUM, Command.TEMPORARY_ON}
+    assert {f[4] for f in frames if f[5] == Command.SENSOR_TEMP_HUM} <= {1, 2}
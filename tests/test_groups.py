@@ -0,0 +1,31 @@
+#!/usr/bin/python3
+import json
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.groups import load_groups, parse_target  # noqa: E402
+
+
+def test_parse_target():
+    assert parse_target('tx/1') == ('tx', 1, None)
+    assert parse_target('tx-f/12/BRIGHTNESS') == ('tx-f', 12, 'BRIGHTNESS')
+    for target in ('bind/1', 'tx/a', 'tx', 'tx/1/BRIGHTNESS/x'):
+        try:
+            parse_target(target)
+        except ValueError:
+            continue
+        assert False, target
+
+
+def test_load_groups(tmp_path):
+    path = str(tmp_path / 'groups.json')
+    with open(path, 'w') as f:
+        json.dump({
+            'groups': {'hall': ['tx/1', 'tx-f/4']},
+            'scenes': {'evening': {'tx/1': 'OFF', 'tx-f/4/BRIGHTNESS': 40}},
+        }, f)
+
+    groups, scenes = load_groups(path)
+    assert groups == {'hall': [('tx', 1), ('tx-f', 4)]}
+    assert scenes == {'evening': [('tx-f', 4, 'BRIGHTNESS', '40'), ('tx', 1, None, 'OFF')]}
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+import json
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.auto_discovery import AutoDiscovery  # noqa: E402
+from noolite_mqtt.enums import Command  # noqa: E402
+from noolite_mqtt.hass_discover import diff_discovery, generate_discovery, owned_by  # noqa: E402
+
+DEVICES = [{'type': 'pt111', 'channel': 1}, {'type': 'srf1', 'channel': 2}]
+
+
+def test_unchanged_configs_are_not_published():
+    generated = generate_discovery(DEVICES, 'noolite', 'noolite')
+    # retained payloads may differ in formatting and key order
+    existing = {
+        topic: json.dumps(json.loads(payload), sort_keys=True, indent=1).encode()
+        for topic, payload in generated.items()
+    }
+
+    assert len(generated) == 4
+    assert diff_discovery(existing, generated, 'noolite') == []
+
+
+def test_changed_and_removed_configs():
+    old = generate_discovery(DEVICES + [{'type': 'pm112', 'channel': 3}], 'noolite', 'noolite')
+    existing = {topic: payload.encode() for topic, payload in old.items()}
+    # entity of another bridge with the same name pattern
+    existing['homeassistant/binary_sensor/noolite_open_9/config'] = json.dumps({
+        'device': {'identifiers': ['other_rx_9'], 'via_device': 'other'},
+    }).encode()
+    generated = generate_discovery([{'type': 'pt111', 'channel': 1}, {'type': 'suf1', 'channel': 2}],
+                                   'noolite', 'noolite')
+
+    assert diff_discovery(existing, generated, 'noolite') == [
+        ('homeassistant/light/noolite_switch_2/config', generated['homeassistant/light/noolite_switch_2/config']),
+        ('homeassistant/binary_sensor/noolite_motion_3/config', ''),
+        ('homeassistant/switch/noolite_switch_2/config', ''),
+    ]
+
+
+def test_owned_by():
+    root = generate_discovery([], 'noolite', 'noolite')['homeassistant/binary_sensor/noolite/config']
+
+    assert owned_by(root.encode(), 'noolite')
+    assert not owned_by(root.encode(), 'other')
+    assert not owned_by(b'not json', 'noolite')
+
+
+def test_auto_discovered_configs_are_kept():
+    existing = {
+        topic: payload.encode()
+        for topic, payload in AutoDiscovery('noolite').observe(5, Command.TEMPORARY_ON)
+    }
+    generated = generate_discovery([], 'noolite', 'noolite')
+
+    assert diff_discovery(existing, generated, 'noolite') == []
@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+import os
+import sys
+from urllib.request import urlopen
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.enums import Command, Mode  # noqa: E402
+from noolite_mqtt.metrics import Metrics, MetricsServer, mode_command_labels  # noqa: E402
+
+
+def test_counter_with_labels():
+    metrics = Metrics()
+    frames = metrics.counter('frames_received_total', 'Frames', ('mode', 'command'), mode_command_labels)
+    frames.inc((Mode.RX, Command.TOGGLE))
+    frames.inc((Mode.RX, Command.TOGGLE))
+    frames.inc((Mode.TX_F, 99))
+
+    assert frames.value((Mode.RX, Command.TOGGLE)) == 2
+    assert metrics.render().splitlines() == [
+        '# HELP noolite_frames_received_total Frames',
+        '# TYPE noolite_frames_received_total counter',
+        'noolite_frames_received_total{mode="RX",command="TOGGLE"} 2',
+        'noolite_frames_received_total{mode="TX_F",command="99"} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = Metrics()
+    latency = metrics.histogram('latency_seconds', 'Latency', (0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value)
+
+    lines = metrics.render().splitlines()
+    assert lines[2:] == [
+        'noolite_latency_seconds_bucket{le="0.1"} 2',
+        'noolite_latency_seconds_bucket{le="1.0"} 3',
+        'noolite_latency_seconds_bucket{le="+Inf"} 4',
+        'noolite_latency_seconds_sum 2.65',
+        'noolite_latency_seconds_count 4',
+    ]
+
+
+def test_server_renders_on_scrape():
+    metrics = Metrics()
+    depth = [3]
+    metrics.gauge_func('tx_queue_depth', 'Depth', lambda: depth[0])
+    server = MetricsServer(metrics, 0).start()
+    try:
+        url = 'http://127.0.0.1:%d/metrics' % server.port
+        assert 'noolite_tx_queue_depth 3' in urlopen(url, timeout=2).read().decode()
+        depth[0] = 5
+        assert 'noolite_tx_queue_depth 5' in urlopen(url, timeout=2).read().decode()
+    finally:
+        server.stop()
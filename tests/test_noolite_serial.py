@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.enums import Command, Mode, Request  # noqa: E402
+from noolite_mqtt.noolite_serial import FrameParser, NooLiteCommand, encode_frame  # noqa: E402
+
+
+def rx_frame(ch: int, cmd: int, mode: int = 1, d0: int = 0) -> bytes:
+    body = [173, mode, 0, 0, ch, cmd, 0, d0, 0, 0, 0, 0, 0, 0, 0]
+    return bytes(body + [sum(body) & 0xff, 174])
+
+
+def test_aligned_frames():
+    parser = FrameParser()
+    frames = [rx_frame(1, 4), rx_frame(2, 21, d0=200)]
+
+    assert parser.feed(b''.join(frames)) == frames
+    assert parser.stats() == {'frames': 2, 'resyncs': 0, 'crc_errors': 0}
+
+
+def test_frame_split_between_reads():
+    parser = FrameParser()
+    frame = rx_frame(3, 2)
+
+    assert parser.feed(frame[:5]) == []
+    assert parser.feed(frame[5:16]) == []
+    assert parser.feed(frame[16:] + frame[:1]) == [frame]
+    assert parser.feed(frame[1:]) == [frame]
+
+
+def test_resync_after_dropped_byte():
+    parser = FrameParser()
+    first, second, third = rx_frame(1, 4), rx_frame(2, 4), rx_frame(3, 4)
+
+    assert parser.feed(first[:7] + first[8:] + second + third) == [second, third]
+    assert parser.resyncs == 1
+    assert parser.crc_errors == 0
+
+
+def test_crc_error_skips_frame():
+    parser = FrameParser()
+    broken = bytearray(rx_frame(1, 4))
+    broken[7] ^= 0x01
+
+    assert parser.feed(bytes(broken) + rx_frame(2, 0)) == [rx_frame(2, 0)]
+    assert parser.crc_errors == 1
+
+
+def test_garbage_between_frames():
+    parser = FrameParser()
+
+    assert parser.feed(b'\x00\x01\xad\x02' + rx_frame(5, 2) + b'\xff' * 40 + rx_frame(6, 0)) == [
+        rx_frame(5, 2), rx_frame(6, 0)
+    ]
+    assert parser.resyncs >= 2
+
+
+def test_command_encoding():
+    frame = NooLiteCommand(5, Command.BRIGHT_SET, Mode.TX_F, fmt=1, d0=100).to_bytes()
+    body = [171, 2, 0, 0, 5, 6, 1, 100, 0, 0, 0, 0, 0, 0, 0]
+
+    assert list(frame) == body + [sum(body) & 0xff, 172]
+
+
+def test_cached_frames_match_encoder():
+    for mode in (Mode.TX, Mode.TX_F):
+        for cmd in (Command.ON, Command.OFF, Command.TOGGLE, Command.READ_STATE):
+            assert encode_frame(63, cmd, mode) == bytes(NooLiteCommand(63, cmd, mode).to_bytes())
+
+    assert encode_frame(1, Command.ON, Mode.TX) is encode_frame(1, Command.ON, Mode.TX)
+    assert encode_frame(1, Command.ON, Mode.TX_F, ctr=Request.BIND_START)[2] == Request.BIND_START
@@ -0,0 +1,30 @@
+#!/usr/bin/python3
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.outbox import DROP_COALESCE, DROP_OLDEST, Outbox  # noqa: E402
+
+
+def test_oldest_messages_are_dropped():
+    outbox = Outbox(max_size=2, policy=DROP_OLDEST)
+    outbox.put('button/1', 'TOGGLE')
+    outbox.put('button/1', 'TOGGLE')
+    outbox.put('switch/2', 'ON', retain=True)
+
+    assert list(outbox.drain()) == [('button/1', 'TOGGLE', 0, False), ('switch/2', 'ON', 0, True)]
+    assert len(outbox) == 0
+    assert outbox.stats() == {'depth': 0, 'max_depth': 2, 'dropped': 1, 'coalesced': 0, 'flushed': 2}
+
+
+def test_coalesce_keeps_latest_message_per_topic():
+    outbox = Outbox(max_size=2, policy=DROP_COALESCE)
+    outbox.put('temperature/1', '21.0')
+    outbox.put('humidity/1', '40')
+    outbox.put('temperature/1', '21.5')
+    # the full outbox drops the topic updated longest ago
+    outbox.put('battery/1', '3.1')
+
+    assert list(outbox.drain()) == [('temperature/1', '21.5', 0, False), ('battery/1', '3.1', 0, False)]
+    assert outbox.stats()['coalesced'] == 1
+    assert outbox.stats()['dropped'] == 1
@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.adapter import Adapter  # noqa: E402
+from noolite_mqtt.enums import Command, Mode, Response  # noqa: E402
+from noolite_mqtt.tx_queue import PRIORITY_BACKGROUND  # noqa: E402
+from fake_serial import FakeSerial  # noqa: E402
+
+
+def answer(ch, cmd, status=Response.SUCCESS):
+    return bytes([173, Mode.TX_F, status, 0, ch, cmd] + [0] * 11)
+
+
+def make(max_attempts=3, max_size=64):
+    serial = FakeSerial()
+    results = []
+    # the TX queue and request tracking are wired by the adapter like in the bridge
+    adapter = Adapter(
+        0, serial, lambda _adapter, request, result, attempts, rtt: results.append((request.ch, result, attempts, rtt)),
+        {'interval': 0.0, 'max_size': max_size}, {'max_attempts': max_attempts, 'timeout': 1.0, 'backoff': 0.5}
+    )
+    return serial, adapter.tx_queue, adapter.pending, results
+
+
+def test_success_resolves_request():
+    serial, queue, pending, results = make()
+    queue.put(3, Command.ON, mode=Mode.TX_F)
+    queue.process(10.0)
+
+    assert not pending.on_frame(answer(4, Command.ON), 10.1)
+    assert pending.on_frame(answer(3, Command.ON), 10.2)
+    assert len(pending) == 0
+    assert results[0][:3] == (3, 'SUCCESS', 1)
+    assert abs(results[0][3] - 0.2) < 1e-9
+
+
+def test_read_state_resolved_by_send_state():
+    serial, queue, pending, results = make()
+    queue.put(3, Command.READ_STATE, mode=Mode.TX_F)
+    queue.process(10.0)
+
+    assert pending.on_frame(answer(3, Command.SEND_STATE), 10.1)
+    assert results[0][:3] == (3, 'SUCCESS', 1)
+
+
+def test_no_response_is_retried_with_backoff():
+    serial, queue, pending, results = make(max_attempts=3)
+    queue.put(3, Command.ON, mode=Mode.TX_F)
+    queue.process(10.0)
+
+    pending.on_frame(answer(3, Command.ON, Response.NO_RESPONSE), 10.1)
+    assert pending.next_deadline() == 10.6
+    pending.process(10.6)
+    queue.process(10.6)
+    assert len(serial.sent) == 2
+
+    # second attempt times out, the next retry waits twice as long
+    pending.process(11.6)
+    assert pending.next_deadline() == 12.6
+    pending.process(12.6)
+    queue.process(12.6)
+    pending.on_frame(answer(3, Command.ON, Response.NO_RESPONSE), 12.7)
+
+    assert len(serial.sent) == 3
+    assert results == [(3, 'NO_RESPONSE', 3, results[0][3])]
+
+
+def test_toggle_is_not_retried():
+    serial, queue, pending, results = make()
+    queue.put(3, Command.TOGGLE, mode=Mode.TX_F)
+    queue.process(10.0)
+
+    pending.process(11.0)
+    assert results[0][:3] == (3, 'TIMEOUT', 1)
+    assert pending.stats()['retries'] == 0
+
+
+def test_retry_is_not_coalesced():
+    serial, queue, pending, results = make()
+    queue.put(5, Command.ON, mode=Mode.TX_F)
+    queue.process(10.0)
+    pending.on_frame(answer(5, Command.ON, Response.NO_RESPONSE), 10.1)
+    pending.process(10.6)
+    # the user switches the light off while the retry is queued
+    queue.put(5, Command.OFF, mode=Mode.TX_F)
+    assert len(queue) == 2
+
+    queue.process(10.6)
+    pending.on_frame(answer(5, Command.ON), 10.7)
+    queue.process(10.7)
+    pending.on_frame(answer(5, Command.OFF), 10.8)
+
+    assert [sent[:2] for sent in serial.sent] == [(5, Command.ON), (5, Command.ON), (5, Command.OFF)]
+    assert [result[:3] for result in results] == [(5, 'SUCCESS', 2), (5, 'SUCCESS', 1)]
+    assert len(pending) == 0
+
+
+def test_evicted_retry_is_resolved():
+    serial, queue, pending, results = make(max_size=2)
+    queue.put(5, Command.READ_STATE, mode=Mode.TX_F, priority=PRIORITY_BACKGROUND)
+    queue.process(10.0)
+    pending.on_frame(answer(5, Command.READ_STATE, Response.NO_RESPONSE), 10.1)
+    pending.process(10.6)
+    assert len(queue) == 1
+
+    # interactive commands push the background retry out of the full queue
+    queue.put(1, Command.ON, mode=Mode.TX_F)
+    queue.put(2, Command.ON, mode=Mode.TX_F)
+
+    assert results == [(5, 'TIMEOUT', 1, results[0][3])]
+    assert len(pending) == 0
@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.poller import StatePoller, channel_ranges  # noqa: E402
+
+
+def run(poller, until, step=1.0):
+    now = 0.0
+    while now <= until:
+        poller.process(now)
+        now += step
+
+
+def test_channels_are_spread_over_period():
+    requests = []
+    poller = StatePoller([1, 2, 3, 4], requests.append, lambda ch: False, period=40)
+    poller._next_at = 0.0
+
+    run(poller, 79)
+    assert requests == [1, 2, 3, 4, 1, 2, 3, 4]
+    assert poller.next_deadline() == 80.0
+
+
+def test_silent_channel_backs_off():
+    requests = []
+    answering = {1: False, 2: True}
+
+    def request(ch):
+        requests.append(ch)
+        poller.on_result(ch, answering[ch])
+
+    poller = StatePoller([1, 2], request, lambda ch: False, period=2, max_backoff=4)
+    poller._next_at = 0.0
+
+    run(poller, 9)
+    # 1 gives every other slot away after the first failure, then three of four
+    assert requests == [1, 2, 2, 1, 2, 2, 2, 2, 1, 2]
+    assert poller.stats()['backed_off'] == 1
+
+    answering[1] = True
+    requests.clear()
+    poller._next_at = 0.0
+    run(poller, 6)
+    # back to every round once answered
+    assert requests == [2, 2, 2, 1, 2, 1, 2]
+
+
+def test_poll_waits_for_user_commands():
+    requests = []
+    busy = [True]
+    poller = StatePoller([1], requests.append, lambda ch: busy[0], period=10, pause=0.5)
+    poller._next_at = 0.0
+
+    poller.process(0)
+    assert requests == [] and poller.next_deadline() == 0.5
+    busy[0] = False
+    poller.process(0.5)
+    assert requests == [1]
+    assert poller.stats()['pauses'] == 1
+
+
+def test_channel_ranges():
+    assert channel_ranges('0,3,10-12') == [0, 3, 10, 11, 12]
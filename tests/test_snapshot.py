@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.decoders import Topics  # noqa: E402
+from noolite_mqtt.snapshot import Snapshot  # noqa: E402
+
+
+def test_state_and_timers_survive_restart(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    topics = Topics('noolite')
+
+    snapshot = Snapshot(path, topics)
+    snapshot.set_value('noolite/state-f/1', 'ON')
+    snapshot.set_value('noolite/temperature/2', '21.5')
+    snapshot.set_value('noolite/echo/2', '[173]')
+    snapshot.set_value('noolite/switch/3', 'ON')
+    snapshot.set_timer('noolite/switch/3', 30, 'OFF')
+    snapshot.set_timer('noolite/switch/4', -5, 'OFF')
+    snapshot.set_timer('noolite/switch/5', 30, 'OFF')
+    snapshot.clear_timer('noolite/switch/5')
+    # nothing is written until processed or closed
+    assert snapshot.next_flush() is not None
+    snapshot.close()
+
+    snapshot = Snapshot(path, topics)
+    assert sorted(snapshot.values()) == [
+        ('noolite/state-f/1', 'ON'),
+        ('noolite/switch/3', 'ON'),
+        ('noolite/temperature/2', 21.5),
+    ]
+    timers = {topic: (round(left), payload) for topic, left, payload in snapshot.timers()}
+    assert timers == {'noolite/switch/3': (30, 'OFF'), 'noolite/switch/4': (-5, 'OFF')}
+    assert snapshot.next_flush() is None
+    snapshot.close()
+
+
+def test_other_layout_is_discarded(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    snapshot = Snapshot(path, Topics('noolite'))
+    snapshot.set_value('noolite/state-f/1', 'ON')
+    snapshot.close()
+
+    snapshot = Snapshot(path, Topics('noolite', 128))
+    assert snapshot.values() == []
+    snapshot.close()
@@ -0,0 +1,35 @@
+#!/usr/bin/python3
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.state_cache import PublishCache  # noqa: E402
+
+
+def test_unchanged_values_are_suppressed():
+    cache = PublishCache(max_interval=300)
+
+    assert cache.should_publish('state-f/1', 'ON', now=0)
+    assert not cache.should_publish('state-f/1', 'ON', now=1)
+    assert cache.should_publish('state-f/1', 'OFF', now=2)
+    assert cache.should_publish('state-f/2', 'OFF', now=2)
+    assert cache.stats() == {'topics': 2, 'published': 3, 'suppressed': 1}
+
+
+def test_deadband():
+    cache = PublishCache(max_interval=300)
+
+    assert cache.should_publish('temperature/1', 21.3, deadband=0.15, now=0)
+    assert not cache.should_publish('temperature/1', 21.4, deadband=0.15, now=1)
+    assert not cache.should_publish('temperature/1', 21.2, deadband=0.15, now=2)
+    # drift is measured from the last published value
+    assert cache.should_publish('temperature/1', 21.5, deadband=0.15, now=3)
+
+
+def test_max_interval_lets_heartbeat_through():
+    cache = PublishCache(max_interval=60)
+
+    assert cache.should_publish('humidity/1', 40, now=0)
+    assert not cache.should_publish('humidity/1', 40, now=59)
+    assert cache.should_publish('humidity/1', 40, now=60)
+    assert not cache.should_publish('humidity/1', 40, now=61)
@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.timers import TimerQueue  # noqa: E402
+
+
+def test_expire_in_order():
+    timers = TimerQueue()
+    timers.schedule('b', 20.0, 'OFF-b')
+    timers.schedule('a', 10.0, 'OFF-a')
+    timers.schedule('c', 30.0, 'OFF-c')
+
+    assert timers.next_deadline() == 10.0
+    assert timers.pop_expired(5.0) == []
+    assert timers.pop_expired(20.0) == [('a', 'OFF-a'), ('b', 'OFF-b')]
+    assert timers.next_deadline() == 30.0
+    assert len(timers) == 1
+
+
+def test_cancel_and_reschedule():
+    timers = TimerQueue()
+    timers.schedule('a', 10.0)
+    timers.schedule('b', 15.0)
+
+    assert timers.cancel('a')
+    assert not timers.cancel('a')
+    assert timers.next_deadline() == 15.0
+
+    timers.schedule('b', 40.0, 'late')
+    assert 'b' in timers
+    assert timers.pop_expired(20.0) == []
+    assert timers.pop_expired(40.0) == [('b', 'late')]
+    assert timers.next_deadline() is None
+
+
+def test_cancelled_entries_are_compacted():
+    timers = TimerQueue()
+    for i in range(1000):
+        timers.schedule('motion', float(i))
+
+    assert len(timers) == 1
+    assert len(timers._heap) < 200
+    assert timers.items() == [('motion', 999.0, None)]
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.topic_router import TopicRouter  # noqa: E402
+
+
+def make_router():
+    calls = []
+    router = TopicRouter('home/noolite')
+    for route in ('tx', 'tx-f', 'bind', 'bind-f'):
+        router.add(route, lambda ch, sub, payload, route=route: calls.append((route, ch, sub, payload)))
+    return router, calls
+
+
+def test_routes_commands():
+    router, calls = make_router()
+
+    assert router.route('home/noolite/tx/1', 'ON')
+    assert router.route('home/noolite/tx-f/12/BRIGHTNESS', '42')
+    assert router.route('home/noolite/bind-f/3', '1')
+    assert calls == [
+        ('tx', 1, None, 'ON'),
+        ('tx-f', 12, 'BRIGHTNESS', '42'),
+        ('bind-f', 3, None, '1'),
+    ]
+
+
+def test_rejects_unknown_topics():
+    router, calls = make_router()
+
+    assert not router.route('home/noolite/echo/1', '[]')
+    assert not router.route('other/tx/1', 'ON')
+    assert not router.route('home/noolite/tx/abc', 'ON')
+    assert not router.route('home/noolite/tx', 'ON')
+    assert not router.route('home/noolite/tx/1/BRIGHTNESS/x', '1')
+    assert calls == []
+
+
+def test_subscriptions():
+    router, _ = make_router()
+
+    assert router.subscriptions() == [
+        ('home/noolite/tx/#', 0),
+        ('home/noolite/tx-f/#', 0),
+        ('home/noolite/bind/#', 0),
+        ('home/noolite/bind-f/#', 0),
+    ]
+
+
+def test_named_routes():
+    router, calls = make_router()
+    router.add('group', lambda name, sub, payload: calls.append(('group', name, sub, payload)), named=True)
+
+    assert router.route('home/noolite/group/hall', 'ON')
+    assert router.route('home/noolite/group/hall/BRIGHTNESS', '40')
+    assert not router.route('home/noolite/group', 'ON')
+    assert calls == [
+        ('group', 'hall', None, 'ON'),
+        ('group', 'hall', 'BRIGHTNESS', '40'),
+    ]
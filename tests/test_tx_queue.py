@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from noolite_mqtt.enums import Command, Mode  # noqa: E402
+from noolite_mqtt.tx_queue import PRIORITY_AUTOMATION, PRIORITY_BACKGROUND, TxQueue  # noqa: E402
+from fake_serial import FakeSerial  # noqa: E402
+
+
+def test_put_does_not_send():
+    serial = FakeSerial()
+    queue = TxQueue(serial, interval=0.3)
+
+    assert queue.put(1, Command.ON)
+    assert serial.sent == []
+    assert len(queue) == 1
+
+
+def test_process_keeps_interval():
+    serial = FakeSerial()
+    queue = TxQueue(serial, interval=0.3)
+    for ch in range(3):
+        queue.put(ch, Command.ON, mode=Mode.TX_F)
+
+    assert queue.process(100.0) == 1
+    assert queue.next_deadline() == 100.3
+    assert queue.process(100.1) == 0
+    assert queue.process(100.3) == 1
+    assert queue.process(100.6) == 1
+    assert queue.next_deadline() is None
+    assert [s[0] for s in serial.sent] == [0, 1, 2]
+
+
+def test_bounded_queue_drops():
+    serial = FakeSerial()
+    queue = TxQueue(serial, interval=0.3, max_size=2)
+
+    assert queue.put(1, Command.ON)
+    assert queue.put(2, Command.ON)
+    assert not queue.put(3, Command.ON)
+
+    stats = queue.stats()
+    assert stats['depth'] == 2
+    assert stats['max_depth'] == 2
+    assert stats['dropped'] == 1
+
+
+def test_params_are_passed():
+    serial = FakeSerial()
+    queue = TxQueue(serial)
+    queue.put(5, Command.BRIGHT_SET, mode=Mode.TX, fmt=1, d0=100)
+    queue.process()
+
+    assert serial.sent == [(5, Command.BRIGHT_SET, Mode.TX, 0, {'fmt': 1, 'd0': 100})]
+
+
+def response(ch, mode=Mode.TX_F, togl=0):
+    return bytes([173, mode, 0, togl, ch, Command.SEND_STATE] + [0] * 11)
+
+
+def test_response_pacing_releases_on_response():
+    serial = FakeSerial()
+    queue = TxQueue(serial, interval=0.3, pacing='response', response_timeout=0.5)
+    queue.put(1, Command.ON, mode=Mode.TX_F)
+    queue.put(2, Command.ON, mode=Mode.TX_F)
+
+    assert queue.process(100.0) == 1
+    assert queue.next_deadline() == 100.5
+    assert not queue.on_frame(response(2), 100.05)
+    assert not queue.on_frame(response(1, togl=1), 100.05)
+    assert queue.on_frame(response(1), 100.06)
+    assert queue.process(100.06) == 1
+    assert queue.stats()['responses'] == 1
+
+
+def test_response_pacing_timeout():
+    serial = FakeSerial()
+    queue = TxQueue(serial, pacing='response', response_timeout=0.5)
+    queue.put(1, Command.ON, mode=Mode.TX_F)
+    queue.put(2, Command.ON, mode=Mode.TX_F)
+
+    queue.process(100.0)
+    assert queue.process(100.4) == 0
+    assert queue.process(100.5) == 1
+    assert queue.stats()['response_timeouts'] == 1
+
+
+def test_response_pacing_tx_gap():
+    serial = FakeSerial()
+    queue = TxQueue(serial, interval=0.3, pacing='response', tx_gap=0.1)
+    queue.put(1, Command.ON, mode=Mode.TX)
+    queue.put(2, Command.ON, mode=Mode.TX)
+
+    queue.process(100.0)
+    assert queue.next_deadline() == 100.1
+
+
+def test_higher_priority_goes_first():
+    serial = FakeSerial()
+    queue = TxQueue(serial, interval=0.0)
+    queue.put(1, Command.READ_STATE, mode=Mode.TX_F, priority=PRIORITY_BACKGROUND)
+    queue.put(2, Command.OFF, mode=Mode.TX_F, priority=PRIORITY_AUTOMATION)
+    queue.put(3, Command.ON, mode=Mode.TX_F)
+
+    assert queue.depth(PRIORITY_AUTOMATION) == 2
+    queue.process(100.0)
+    assert [s[0] for s in serial.sent] == [3, 2, 1]
+    assert queue.stats()['classes']['background']['sent'] == 1
+
+
+def test_full_queue_evicts_lower_priority():
+    serial = FakeSerial()
+    queue = TxQueue(serial, max_size=2)
+    queue.put(1, Command.READ_STATE, mode=Mode.TX_F, priority=PRIORITY_BACKGROUND)
+    queue.put(2, Command.READ_STATE, mode=Mode.TX_F, priority=PRIORITY_BACKGROUND)
+
+    assert queue.put(3, Command.ON)
+    assert not queue.put(4, Command.READ_STATE, priority=PRIORITY_BACKGROUND)
+    queue.process(100.0)
+    queue.process(101.0)
+    assert [s[0] for s in serial.sent] == [3, 1]
+    assert queue.stats()['dropped'] == 2
+
+
+def test_token_bucket_keeps_reserve_for_interactive():
+    serial = FakeSerial()
+    queue = TxQueue(serial, interval=0.0, rate=1.0, burst=4.0)
+    queue._refilled_at = 100.0
+    for ch in range(4):
+        queue.put(ch, Command.READ_STATE, mode=Mode.TX_F, priority=PRIORITY_BACKGROUND)
+
+    # background commands stop when half of the bucket is left
+    assert queue.process(100.0) == 2
+    assert queue.next_deadline() == 101.0
+
+    queue.put(10, Command.ON)
+    assert queue.next_deadline() == 100.0
+    assert queue.process(100.0) == 1
+    assert [s[0] for s in serial.sent] == [0, 1, 10]
+    assert queue.process(102.0) == 1
+
+
+def test_brightness_coalesced():
+    serial = FakeSerial()
+    queue = TxQueue(serial)
+    queue.put(1, Command.ON, mode=Mode.TX_F)
+    for value in (10, 20, 30):
+        queue.put(2, Command.BRIGHT_SET, mode=Mode.TX_F, fmt=1, d0=value)
+    queue.put(2, Command.BRIGHT_SET, mode=Mode.TX, fmt=1, d0=40)
+
+    assert len(queue) == 3
+    assert queue.stats()['coalesced'] == 2
+    for now in (100.0, 101.0, 102.0):
+        queue.process(now)
+    assert serial.sent[1] == (2, Command.BRIGHT_SET, Mode.TX_F, 0, {'fmt': 1, 'd0': 30})
+    assert serial.sent[2][2] == Mode.TX
+
+
+def test_state_coalesced_with_toggle():
+    serial = FakeSerial()
+    queue = TxQueue(serial)
+    queue.put(1, Command.ON)
+    queue.put(1, Command.TOGGLE)
+    queue.put(2, Command.TOGGLE)
+    queue.put(2, Command.TOGGLE)
+
+    assert len(queue) == 1
+    assert queue.stats()['coalesced'] == 2
+    queue.process(100.0)
+    assert serial.sent == [(1, Command.OFF, Mode.TX, 0, {})]
+
+
+def test_not_coalesced_across_other_commands():
+    serial = FakeSerial()
+    queue = TxQueue(serial)
+    queue.put(1, Command.OFF)
+    queue.put(1, Command.BRIGHT_SET, fmt=1, d0=50)
+    queue.put(1, Command.ON)
+    queue.put(1, Command.ON, coalesce=False)
+
+    assert len(queue) == 4
+    assert queue.stats()['coalesced'] == 0
+
+
+def test_burst_uses_tx_gap():
+    serial = FakeSerial()
+    queue = TxQueue(serial, interval=0.3, tx_gap=0.1)
+    queue.put(1, Command.ON, burst=True)
+    queue.put(2, Command.ON)
+
+    assert queue.process(100.0) == 1
+    assert queue.next_deadline() == 100.1
+    assert queue.process(100.1) == 1
+    assert queue.next_deadline() is None
+    assert serial.sent[0] == (1, Command.ON, Mode.TX, 0, {})